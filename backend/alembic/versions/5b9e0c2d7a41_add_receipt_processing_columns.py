@@ -0,0 +1,42 @@
+"""Add receipt processing and transaction feedback columns
+
+Revision ID: 5b9e0c2d7a41
+Revises: 8c2d4f1a9b7e
+Create Date: 2026-10-15 11:48:52.930176
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b9e0c2d7a41'
+down_revision = '8c2d4f1a9b7e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('status', sa.String(), nullable=True))
+    op.add_column('receipts', sa.Column('error_message', sa.String(), nullable=True))
+    op.add_column('receipts', sa.Column('processing_time', sa.Float(), nullable=True))
+    op.add_column('receipts', sa.Column('progress', sa.Float(), nullable=True))
+    op.add_column('receipts', sa.Column('feedback', sa.JSON(), nullable=True))
+    op.add_column('extracted_transactions', sa.Column('user_verified', sa.Boolean(), nullable=True))
+    op.add_column('extracted_transactions', sa.Column('confidence_score', sa.Float(), nullable=True))
+    op.add_column('extracted_transactions', sa.Column('original_text', sa.String(), nullable=True))
+    op.add_column('extracted_transactions', sa.Column('correction_history', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('extracted_transactions') as batch_op:
+        batch_op.drop_column('correction_history')
+        batch_op.drop_column('original_text')
+        batch_op.drop_column('confidence_score')
+        batch_op.drop_column('user_verified')
+    with op.batch_alter_table('receipts') as batch_op:
+        batch_op.drop_column('feedback')
+        batch_op.drop_column('progress')
+        batch_op.drop_column('processing_time')
+        batch_op.drop_column('error_message')
+        batch_op.drop_column('status')
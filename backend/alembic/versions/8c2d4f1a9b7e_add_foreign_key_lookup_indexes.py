@@ -0,0 +1,28 @@
+"""Add indexes on receipt, extracted transaction and expense foreign keys
+
+Revision ID: 8c2d4f1a9b7e
+Revises: 31363205473f
+Create Date: 2026-10-15 09:12:40.215837
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c2d4f1a9b7e'
+down_revision = '31363205473f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_receipts_user_id'), 'receipts', ['user_id'], unique=False)
+    op.create_index(op.f('ix_extracted_transactions_receipt_id'), 'extracted_transactions', ['receipt_id'], unique=False)
+    op.create_index(op.f('ix_expenses_user_id'), 'expenses', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_expenses_user_id'), table_name='expenses')
+    op.drop_index(op.f('ix_extracted_transactions_receipt_id'), table_name='extracted_transactions')
+    op.drop_index(op.f('ix_receipts_user_id'), table_name='receipts')
@@ -0,0 +1,30 @@
+"""Add receipt content digest for duplicate upload detection
+
+Revision ID: a6f1c9e4b273
+Revises: f3c8d2e6a415
+Create Date: 2026-10-15 16:41:08.219734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6f1c9e4b273'
+down_revision = 'f3c8d2e6a415'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('receipts', sa.Column('content_sha256', sa.String(length=64), nullable=True))
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index('ix_receipts_user_content_sha256', 'receipts', ['user_id', 'content_sha256'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_receipts_user_content_sha256', table_name='receipts', postgresql_concurrently=True)
+    op.drop_column('receipts', 'content_sha256')
@@ -0,0 +1,28 @@
+"""Add (user_id, id) index for keyset-paginated receipt lists
+
+Revision ID: b82e5d7f0c19
+Revises: a6f1c9e4b273
+Create Date: 2026-10-15 17:12:44.508193
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b82e5d7f0c19'
+down_revision = 'a6f1c9e4b273'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index('ix_receipts_user_id_id', 'receipts', ['user_id', 'id'], unique=False,
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_receipts_user_id_id', table_name='receipts', postgresql_concurrently=True)
@@ -0,0 +1,35 @@
+"""Add composite user/date, category and receipt status indexes
+
+Revision ID: d41e7a3c5f20
+Revises: 5b9e0c2d7a41
+Create Date: 2026-10-15 11:03:27.604412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41e7a3c5f20'
+down_revision = '5b9e0c2d7a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction on PostgreSQL
+    with op.get_context().autocommit_block():
+        op.create_index('ix_incomes_user_date', 'incomes', ['user_id', 'date'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_incomes_category', 'incomes', ['category'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_expenses_user_date', 'expenses', ['user_id', 'date'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_expenses_category', 'expenses', ['category'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_receipts_user_status', 'receipts', ['user_id', 'status'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_receipts_user_status', table_name='receipts', postgresql_concurrently=True)
+        op.drop_index('ix_expenses_category', table_name='expenses', postgresql_concurrently=True)
+        op.drop_index('ix_expenses_user_date', table_name='expenses', postgresql_concurrently=True)
+        op.drop_index('ix_incomes_category', table_name='incomes', postgresql_concurrently=True)
+        op.drop_index('ix_incomes_user_date', table_name='incomes', postgresql_concurrently=True)
@@ -0,0 +1,42 @@
+"""Use jsonb with GIN indexes for receipt feedback and correction history
+
+Revision ID: e7a90b3d1c62
+Revises: d41e7a3c5f20
+Create Date: 2026-10-15 13:20:05.118374
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a90b3d1c62'
+down_revision = 'd41e7a3c5f20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Other databases keep the generic JSON type
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('receipts', 'feedback', type_=postgresql.JSONB(),
+                    existing_type=sa.JSON(), postgresql_using='feedback::jsonb')
+    op.alter_column('extracted_transactions', 'correction_history', type_=postgresql.JSONB(),
+                    existing_type=sa.JSON(), postgresql_using='correction_history::jsonb')
+    op.create_index('ix_receipts_feedback_gin', 'receipts', ['feedback'],
+                    unique=False, postgresql_using='gin')
+    op.create_index('ix_extracted_transactions_correction_history_gin', 'extracted_transactions',
+                    ['correction_history'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.drop_index('ix_extracted_transactions_correction_history_gin', table_name='extracted_transactions')
+    op.drop_index('ix_receipts_feedback_gin', table_name='receipts')
+    op.alter_column('extracted_transactions', 'correction_history', type_=sa.JSON(),
+                    existing_type=postgresql.JSONB(), postgresql_using='correction_history::json')
+    op.alter_column('receipts', 'feedback', type_=sa.JSON(),
+                    existing_type=postgresql.JSONB(), postgresql_using='feedback::json')
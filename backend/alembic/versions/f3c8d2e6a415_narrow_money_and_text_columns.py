@@ -0,0 +1,41 @@
+"""Store income/expense amounts as Numeric(12, 2) and bound text column lengths
+
+Revision ID: f3c8d2e6a415
+Revises: e7a90b3d1c62
+Create Date: 2026-10-15 14:02:41.557203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c8d2e6a415'
+down_revision = 'e7a90b3d1c62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # batch_alter_table recreates the table on SQLite, which can't ALTER column types
+    for table in ('incomes', 'expenses'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('amount', type_=sa.Numeric(12, 2), existing_type=sa.Float(),
+                                  postgresql_using='amount::numeric(12,2)')
+            batch_op.alter_column('description', type_=sa.String(500), existing_type=sa.String())
+            batch_op.alter_column('category', type_=sa.String(64), existing_type=sa.String())
+    with op.batch_alter_table('receipts') as batch_op:
+        batch_op.alter_column('merchant_name', type_=sa.String(255), existing_type=sa.String(),
+                              existing_nullable=True)
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('receipts') as batch_op:
+        batch_op.alter_column('merchant_name', type_=sa.String(), existing_type=sa.String(255),
+                              existing_nullable=True)
+    for table in ('expenses', 'incomes'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('category', type_=sa.String(), existing_type=sa.String(64))
+            batch_op.alter_column('description', type_=sa.String(), existing_type=sa.String(500))
+            batch_op.alter_column('amount', type_=sa.Float(), existing_type=sa.Numeric(12, 2),
+                                  postgresql_using='amount::double precision')
@@ -1,119 +1,186 @@
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2AuthorizationCodeBearer
-from jose import JWTError, jwt
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from jose import jwt
 from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+import hashlib
+import logging
 import time
 import os
 import requests as http_requests
-from config import GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, SECRET_KEY, DEMO_MODE
+from requests.adapters import HTTPAdapter
+from config import CONFIG, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, SECRET_KEY, DEMO_MODE
 
-# Import Google OAuth libraries for authentication
-from google.oauth2 import id_token
-from google.auth.transport import requests
+logger = logging.getLogger(__name__)
 
 # Authentication constants
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ALGORITHM = CONFIG.ALGORITHM
+ACCESS_TOKEN_EXPIRE_MINUTES = CONFIG.ACCESS_TOKEN_EXPIRE_MINUTES
 
-oauth2_scheme = OAuth2AuthorizationCodeBearer(
-    authorizationUrl="https://accounts.google.com/o/oauth2/v2/auth",
-    tokenUrl="https://oauth2.googleapis.com/token",
-)
+# Decode settings built once at import instead of per request
+_JWT_ALGORITHMS = [ALGORITHM]
+_JWT_OPTIONS = {"require_exp": True, "require_sub": True}
+
+# Shared HTTP session so tokeninfo calls reuse pooled TLS connections
+GOOGLE_HTTP_TIMEOUT = (2, 5)  # (connect, read) seconds
+_http_session = http_requests.Session()
+_http_session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50))
+
+# Google's ID token signing keys, cached by key id for an hour
+GOOGLE_CERTS_URL = "https://www.googleapis.com/oauth2/v3/certs"
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+JWKS_CACHE_TTL_SECONDS = 3600
+_google_jwks: Dict[str, dict] = {}
+_google_jwks_expires_at = 0.0
+
+def _get_google_jwks() -> Dict[str, dict]:
+    """Return Google's signing keys by kid, refetching at most once per TTL."""
+    global _google_jwks, _google_jwks_expires_at
+    if time.time() >= _google_jwks_expires_at:
+        response = _http_session.get(GOOGLE_CERTS_URL, timeout=GOOGLE_HTTP_TIMEOUT)
+        response.raise_for_status()
+        _google_jwks = {key["kid"]: key for key in response.json()["keys"]}
+        _google_jwks_expires_at = time.time() + JWKS_CACHE_TTL_SECONDS
+    return _google_jwks
+
+def _verify_id_token_locally(token: str) -> Optional[dict]:
+    """Verify a Google ID token with python-jose; None if its signing key isn't cached."""
+    key = _get_google_jwks().get(jwt.get_unverified_header(token).get("kid"))
+    if key is None:
+        return None
+    return jwt.decode(
+        token, key, algorithms=["RS256"], audience=GOOGLE_CLIENT_ID, issuer=GOOGLE_ISSUERS,
+        options={"verify_at_hash": False}
+    )
+
+# Identity returned for every token when running in demo mode
+DEMO_USER_INFO = {
+    "email": "demo@example.com",
+    "sub": "demo-user-123",
+    "name": "Demo User",
+    "picture": None,
+}
+
+@lru_cache(maxsize=None)
+def _load_google():
+    """Import the Google OAuth libraries on first use and build the verify transport."""
+    import cachecontrol
+    from google.oauth2 import id_token
+    from google.auth.transport import requests
+
+    # google-auth ignores Cache-Control on its cert fetches, so wrap the transport
+    # session to keep Google's public certs for as long as their max-age allows
+    google_request = requests.Request(session=cachecontrol.CacheControl(http_requests.Session()))
+    return id_token, google_request
+
+# Cache of verified tokens keyed by sha256(token) -> (payload, expires_at).
+# Tokens are hashed so raw credentials are never held in memory.
+TOKEN_CACHE_TTL_SECONDS = 300
+TOKEN_CACHE_MAX_SIZE = 10_000
+# Treat tokens this close to their own expiry as a cache miss
+TOKEN_EXPIRY_LEEWAY_SECONDS = 30
+
+_google_token_cache: Dict[bytes, Tuple[dict, float]] = {}
+_jwt_payload_cache: Dict[bytes, Tuple[dict, float]] = {}
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def get_cached_token(cache: Dict[bytes, Tuple[dict, float]], token: str) -> Optional[dict]:
+    """Return the cached payload for a token if it is still valid."""
+    key = _token_cache_key(token)
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    payload, expires_at = entry
+    now = time.time()
+    if expires_at <= now or float(payload.get("exp", 0)) <= now + TOKEN_EXPIRY_LEEWAY_SECONDS:
+        cache.pop(key, None)
+        return None
+    return payload
+
+def cache_token(cache: Dict[bytes, Tuple[dict, float]], token: str, payload: dict) -> None:
+    """Cache a verified payload until min(TTL, token exp)."""
+    now = time.time()
+    try:
+        ttl = min(TOKEN_CACHE_TTL_SECONDS, float(payload.get("exp", 0)) - now)
+    except (TypeError, ValueError):
+        return
+    if ttl <= TOKEN_EXPIRY_LEEWAY_SECONDS:
+        return
+    if len(cache) >= TOKEN_CACHE_MAX_SIZE:
+        # Drop expired entries first, then the oldest insertions
+        for key in [k for k, (_, exp) in cache.items() if exp <= now]:
+            del cache[key]
+        while len(cache) >= TOKEN_CACHE_MAX_SIZE:
+            del cache[next(iter(cache))]
+    cache[_token_cache_key(token)] = (payload, now + ttl)
+
+async def verify_google_token(token: str):
+    # Demo mode never talks to Google
+    if DEMO_MODE:
+        return dict(DEMO_USER_INFO)
+
+    # Skip the Google round trip for tokens we have already verified
+    if token:
+        cached_idinfo = get_cached_token(_google_token_cache, token)
+        if cached_idinfo is not None:
+            return cached_idinfo
 
-def verify_google_token(token: str):
     # Proper authentication using Google OAuth
     try:
-        # Detailed debug logging with [BACKEND] prefix
-        print(f"[BACKEND][AUTH] STEP 1: Authentication request received")
-        print(f"[BACKEND][AUTH] Server environment: {os.getenv('ENVIRONMENT', 'unknown')}")
-        print(f"[BACKEND][AUTH] Configuration: GOOGLE_CLIENT_ID={GOOGLE_CLIENT_ID[:10]}...")
-        print(f"[BACKEND][AUTH] Has GOOGLE_CLIENT_SECRET: {'Yes' if GOOGLE_CLIENT_SECRET else 'No'}")
-        
+        logger.debug("[BACKEND][AUTH] Authentication request received (environment=%s, has client secret=%s)",
+                     os.getenv('ENVIRONMENT', 'unknown'), bool(GOOGLE_CLIENT_SECRET))
+
         # Check if token is valid
         if not token:
-            print("[BACKEND][AUTH] ERROR: No token provided in request")
-            print("[BACKEND][AUTH] This indicates a client error - missing token in request")
             raise ValueError('No token provided')
-        
-        print(f"[BACKEND][AUTH] STEP 2: Token validation - Length check")
-        print(f"[BACKEND][AUTH] Token length: {len(token)}")
-        print(f"[BACKEND][AUTH] Token preview: {token[:10]}...{token[-10:]}")
-        
+
         if len(token) < 10:
-            print("[BACKEND][AUTH] ERROR: Token too short (< 10 chars)")
-            print("[BACKEND][AUTH] This indicates an invalid token format")
             raise ValueError('Invalid token format - token too short')
-        
+
         # Check token type - handle both ID tokens and access tokens
         is_access_token = token.startswith('ya29.')
-        print(f"[BACKEND][AUTH] STEP 3: Token type identification")
-        print(f"[BACKEND][AUTH] Token appears to be an access token: {is_access_token}")
-        print(f"[BACKEND][AUTH] Token starts with: {token[:5]}")
-        
+        logger.debug("[BACKEND][AUTH] Token appears to be an access token: %s", is_access_token)
+
         idinfo = None
-        
+
         if is_access_token:
             # For access tokens, we need to use Google's tokeninfo endpoint
-            print(f"[BACKEND][AUTH] STEP 4A: Verifying Access Token via Google tokeninfo endpoint")
-            print(f"[BACKEND][AUTH] Using endpoint: https://oauth2.googleapis.com/tokeninfo")
-            try:
-                # Call Google's tokeninfo endpoint
-                print(f"[BACKEND][AUTH] Sending request to Google tokeninfo API...")
-                response = http_requests.get(f"https://oauth2.googleapis.com/tokeninfo?access_token={token}")
-                if response.status_code == 200:
-                    print(f"[BACKEND][AUTH] SUCCESS: Access token verified by Google")
-                    idinfo = response.json()
-                    print(f"[BACKEND][AUTH] User info received: email={idinfo.get('email', 'unknown')}")
-                    print(f"[BACKEND][AUTH] Token audience: {idinfo.get('aud', 'unknown')}")
-                    print(f"[BACKEND][AUTH] Token expiration: {idinfo.get('exp', 'unknown')}")
-                else:
-                    print(f"[BACKEND][AUTH] FAILED: Token verification failed with status: {response.status_code}")
-                    print(f"[BACKEND][AUTH] Error details: {response.text}")
-                    raise ValueError(f"Invalid access token: {response.text}")
-            except Exception as ve:
-                print(f"[BACKEND][AUTH] CRITICAL ERROR during token verification: {str(ve)}")
-                print(f"[BACKEND][AUTH] Exception type: {type(ve).__name__}")
-                raise ve
+            logger.debug("[BACKEND][AUTH] Verifying access token via Google tokeninfo endpoint")
+            response = await run_in_threadpool(
+                _http_session.get,
+                f"https://oauth2.googleapis.com/tokeninfo?access_token={token}",
+                timeout=GOOGLE_HTTP_TIMEOUT,
+            )
+            if response.status_code != 200:
+                logger.debug("[BACKEND][AUTH] Tokeninfo returned status %s", response.status_code)
+                raise ValueError(f"Invalid access token: {response.text}")
+            idinfo = response.json()
         else:
-            # For ID tokens, use the traditional verification
-            print(f"[BACKEND][AUTH] STEP 4B: Verifying ID Token via Google library")
-            print(f"[BACKEND][AUTH] Using google.oauth2.id_token.verify_oauth2_token")
-            try:
-                print(f"[BACKEND][AUTH] Calling Google's verify_oauth2_token method...")
-                idinfo = id_token.verify_oauth2_token(
-                    token, requests.Request(), GOOGLE_CLIENT_ID)
-                print(f"[BACKEND][AUTH] SUCCESS: ID token verified successfully")
-                print(f"[BACKEND][AUTH] Token details: issuer={idinfo.get('iss', 'unknown')}")
-                print(f"[BACKEND][AUTH] Token audience: {idinfo.get('aud', 'unknown')}")
-                print(f"[BACKEND][AUTH] Token subject: {idinfo.get('sub', 'unknown')}")
-            except Exception as ve:
-                print(f"[BACKEND][AUTH] FAILED: ID token verification error: {str(ve)}")
-                print(f"[BACKEND][AUTH] Exception type: {type(ve).__name__}")
-                raise ve
-            
+            # For ID tokens, verify the signature locally against Google's cached keys
+            logger.debug("[BACKEND][AUTH] Verifying ID token against cached Google JWKS")
+            idinfo = await run_in_threadpool(_verify_id_token_locally, token)
+            if idinfo is None:
+                # Signing key not in our cache (e.g. just rotated): use the traditional verification
+                logger.debug("[BACKEND][AUTH] Key id not cached, verifying via google.oauth2.id_token")
+                id_token, google_request = _load_google()
+                idinfo = await run_in_threadpool(
+                    id_token.verify_oauth2_token, token, google_request, GOOGLE_CLIENT_ID)
+
             # Validate the issuer for ID tokens
-            print(f"[BACKEND][AUTH] STEP 5: Validating token issuer")
-            if idinfo.get('iss') not in ['accounts.google.com', 'https://accounts.google.com']:
-                print(f"[BACKEND][AUTH] ERROR: Invalid token issuer: {idinfo.get('iss')}")
-                print(f"[BACKEND][AUTH] Expected issuers: accounts.google.com or https://accounts.google.com")
+            if idinfo.get('iss') not in GOOGLE_ISSUERS:
                 raise ValueError(f"Invalid issuer: {idinfo.get('iss')}")
-            else:
-                print(f"[BACKEND][AUTH] Issuer validation passed: {idinfo.get('iss')}")
-        
-        # Log successful authentication    
-        print(f"[BACKEND][AUTH] STEP 6: Authentication completed successfully")
-        print(f"[BACKEND][AUTH] Authenticated user: {idinfo.get('email', 'unknown')}")
-        print(f"[BACKEND][AUTH] User ID: {idinfo.get('sub', 'unknown')}")
-        print(f"[BACKEND][AUTH] Token expiration: {idinfo.get('exp', 'unknown')}")
-        print(f"[BACKEND][AUTH] --- AUTHENTICATION SUCCESSFUL ---")
+
+        logger.debug("[BACKEND][AUTH] Authenticated user %s (sub=%s, exp=%s)",
+                     idinfo.get('email', 'unknown'), idinfo.get('sub', 'unknown'), idinfo.get('exp', 'unknown'))
+        cache_token(_google_token_cache, token, idinfo)
         return idinfo
     except Exception as e:
-        print(f"[BACKEND][AUTH] CRITICAL ERROR: Authentication failed: {str(e)}")
-        print(f"[BACKEND][AUTH] Error type: {type(e).__name__}")
-        import traceback
-        print(f"[BACKEND][AUTH] Stack trace: {traceback.format_exc()}")
-        print(f"[BACKEND][AUTH] --- AUTHENTICATION FAILED ---")
-        
+        logger.warning("[BACKEND][AUTH] Authentication failed: %s: %s", type(e).__name__, e,
+                       exc_info=logger.isEnabledFor(logging.DEBUG))
+
         # No more fallbacks to demo mode - properly raise authentication errors
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -128,22 +195,10 @@ def create_access_token(data: dict):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    # In demo mode, always return the demo user
-    if DEMO_MODE:
-        return "demo@example.com"
-    
-    # Real token validation if not in demo mode
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        return email
-    except JWTError:
-        raise credentials_exception 
\ No newline at end of file
+def decode_access_token(token: str) -> dict:
+    """Decode one of our own JWTs, reusing the result for repeat presentations."""
+    payload = get_cached_token(_jwt_payload_cache, token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=_JWT_ALGORITHMS, options=_JWT_OPTIONS)
+        cache_token(_jwt_payload_cache, token, payload)
+    return payload
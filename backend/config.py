@@ -1,75 +1,74 @@
 import os
-from typing import Dict, Any
+import logging
+from dataclasses import dataclass
+from typing import Any, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Check for .env in backend directory first (most likely location)
-env_path = Path(__file__).parent / '.env'
-if env_path.exists():
-    print(f"Loading environment from {env_path}")
-    load_dotenv(dotenv_path=env_path)
-else:
-    # Fallback to project root
-    env_path = Path(__file__).parent.parent / '.env'
-    if env_path.exists():
-        print(f"Loading environment from {env_path}")
-        load_dotenv(dotenv_path=env_path)
+logger = logging.getLogger(__name__)
 
-# Base configuration that applies to all environments
-base_config: Dict[str, Any] = {
-    "PROJECT_NAME": "Business Cost Tracker",
-    "API_PREFIX": "",
-    "SECRET_KEY": os.getenv("SECRET_KEY"),  # Must be set in .env file
-    "ALGORITHM": "HS256",
-    "ACCESS_TOKEN_EXPIRE_MINUTES": 30,
+# Check for .env in backend directory first (most likely location), then project root
+ENV_PATH = next(
+    (path for path in (Path(__file__).parent / '.env', Path(__file__).parent.parent / '.env') if path.exists()),
+    None
+)
+if ENV_PATH is not None:
+    logger.info("Loading environment from %s", ENV_PATH)
+    load_dotenv(dotenv_path=ENV_PATH)
+
+@dataclass(frozen=True)
+class Config:
+    """Immutable settings for the running environment, read from os.environ once."""
+    PROJECT_NAME: str = "Business Cost Tracker"
+    API_PREFIX: str = ""
+    SECRET_KEY: Optional[str] = None  # Must be set in .env file
+    ALGORITHM: str = "HS256"
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    GOOGLE_CLIENT_ID: Optional[str] = None
+    GOOGLE_CLIENT_SECRET: Optional[str] = None
+    TESTING: bool = False
     # Default to demo mode when no credentials are available
-    "DEMO_MODE": True
-}
+    DEMO_MODE: bool = True
 
-# Development environment configuration
-development_config = {
-    **base_config,
-    "GOOGLE_CLIENT_ID": os.getenv("GOOGLE_CLIENT_ID", ""),
-    "GOOGLE_CLIENT_SECRET": os.getenv("GOOGLE_CLIENT_SECRET", ""),
-    "DEMO_MODE": False  # Disable demo mode to use real Google authentication
-}
+    @classmethod
+    def from_env(cls, environment: str) -> "Config":
+        secret_key = os.getenv("SECRET_KEY")
 
-# Testing environment configuration
-testing_config = {
-    **base_config,
-    "TESTING": True,
-    "DEMO_MODE": True  # Always use demo mode in testing
-}
+        # Testing environment configuration
+        if environment == "testing":
+            # Always use demo mode in testing
+            return cls(SECRET_KEY=secret_key, TESTING=True, DEMO_MODE=True)
 
-# Production environment configuration
-production_config = {
-    **base_config,
-    "GOOGLE_CLIENT_ID": os.getenv("GOOGLE_CLIENT_ID"),
-    "GOOGLE_CLIENT_SECRET": os.getenv("GOOGLE_CLIENT_SECRET"),
-    "SECRET_KEY": os.getenv("SECRET_KEY"),  # Must be set in production
-    "DEMO_MODE": False  # Demo mode should be disabled in production
-}
+        # Production environment configuration
+        if environment == "production":
+            return cls(
+                SECRET_KEY=secret_key,  # Must be set in production
+                GOOGLE_CLIENT_ID=os.getenv("GOOGLE_CLIENT_ID"),
+                GOOGLE_CLIENT_SECRET=os.getenv("GOOGLE_CLIENT_SECRET"),
+                DEMO_MODE=False  # Demo mode should be disabled in production
+            )
 
-# Dictionary mapping environment names to their respective configurations
-environments = {
-    "development": development_config,
-    "testing": testing_config,
-    "production": production_config
-}
+        # Development environment configuration (also the fallback)
+        return cls(
+            SECRET_KEY=secret_key,
+            GOOGLE_CLIENT_ID=os.getenv("GOOGLE_CLIENT_ID", ""),
+            GOOGLE_CLIENT_SECRET=os.getenv("GOOGLE_CLIENT_SECRET", ""),
+            DEMO_MODE=False  # Disable demo mode to use real Google authentication
+        )
 
 # Get the current environment or default to development
 ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
 
 # Load the configuration for the current environment
-config = environments.get(ENVIRONMENT, development_config)
+CONFIG = Config.from_env(ENVIRONMENT)
 
 # Helper function to get a configuration value
 def get_config(key: str, default=None) -> Any:
     """Get a configuration value for the current environment."""
-    return config.get(key, default)
+    return getattr(CONFIG, key, default)
 
 # Commonly used config values
-GOOGLE_CLIENT_ID = get_config("GOOGLE_CLIENT_ID")
-GOOGLE_CLIENT_SECRET = get_config("GOOGLE_CLIENT_SECRET")
-SECRET_KEY = get_config("SECRET_KEY")
-DEMO_MODE = get_config("DEMO_MODE")
+GOOGLE_CLIENT_ID = CONFIG.GOOGLE_CLIENT_ID
+GOOGLE_CLIENT_SECRET = CONFIG.GOOGLE_CLIENT_SECRET
+SECRET_KEY = CONFIG.SECRET_KEY
+DEMO_MODE = CONFIG.DEMO_MODE
@@ -1,85 +1,115 @@
-from sqlalchemy.orm import Session
+from typing import Optional
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 import models
 import schemas
 
+# List statements built once so SQLAlchemy's compiled cache always hits. They select
+# from the Core tables: list endpoints only need column values, not ORM instances.
+_incomes = models.Income.__table__
+_expenses = models.Expense.__table__
+_INCOMES_FIRST_PAGE = select(_incomes).order_by(_incomes.c.id.desc()).limit(bindparam("limit"))
+_INCOMES_AFTER_CURSOR = select(_incomes).where(
+    _incomes.c.id < bindparam("cursor_id")
+).order_by(_incomes.c.id.desc()).limit(bindparam("limit"))
+_EXPENSES_FIRST_PAGE = select(_expenses).order_by(_expenses.c.id.desc()).limit(bindparam("limit"))
+_EXPENSES_AFTER_CURSOR = select(_expenses).where(
+    _expenses.c.id < bindparam("cursor_id")
+).order_by(_expenses.c.id.desc()).limit(bindparam("limit"))
+_USER_BY_EMAIL = select(models.User).where(models.User.email == bindparam("email"))
+
 # User operations
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    result = await db.execute(_USER_BY_EMAIL, {"email": email})
+    return result.scalars().first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    # In a real app, hash the password here
-    fake_hashed_password = user.password + "notreallyhashed"
-    db_user = models.User(email=user.email, hashed_password=fake_hashed_password)
+async def create_user(db: AsyncSession, email: str, google_id: str, name: Optional[str] = None,
+                      picture: Optional[str] = None):
+    db_user = models.User(email=email, google_id=google_id, name=name, picture=picture)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 # Income operations
-def get_incomes(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Income).offset(skip).limit(limit).all()
+async def get_incomes(db: AsyncSession, cursor_id: Optional[int] = None, limit: int = 100):
+    # Keyset pagination: newest first, resuming below the last id seen
+    if cursor_id is None:
+        result = await db.execute(_INCOMES_FIRST_PAGE, {"limit": limit})
+    else:
+        result = await db.execute(_INCOMES_AFTER_CURSOR, {"cursor_id": cursor_id, "limit": limit})
+    return [dict(row) for row in result.mappings()]
 
-def create_income(db: Session, income: schemas.IncomeCreate, user_id: int = 1):
-    db_income = models.Income(**income.dict(), user_id=user_id)
-    db.add(db_income)
-    db.commit()
-    db.refresh(db_income)
+async def create_income(db: AsyncSession, income: schemas.IncomeCreate, user_id: int = 1):
+    # INSERT ... RETURNING gives back the new row without a follow-up SELECT
+    result = await db.execute(
+        insert(models.Income).values(**income.model_dump(), user_id=user_id).returning(models.Income)
+    )
+    db_income = result.scalar_one()
+    await db.commit()
     return db_income
 
-def update_income(db: Session, income_id: int, income_data: schemas.IncomeUpdate):
-    db_income = db.query(models.Income).filter(models.Income.id == income_id).first()
+async def update_income(db: AsyncSession, income_id: int, income_data: schemas.IncomeUpdate):
+    db_income = await db.get(models.Income, income_id)
     if db_income is None:
         return None
         
     # Update the income object with new data
-    update_data = income_data.dict(exclude_unset=True)
+    update_data = income_data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_income, key, value)
     
-    db.commit()
-    db.refresh(db_income)
+    await db.commit()
+    await db.refresh(db_income)
     return db_income
 
-def delete_income(db: Session, income_id: int):
-    db_income = db.query(models.Income).filter(models.Income.id == income_id).first()
+async def delete_income(db: AsyncSession, income_id: int):
+    db_income = await db.get(models.Income, income_id)
     if db_income is None:
         return None
-    db.delete(db_income)
-    db.commit()
+    await db.delete(db_income)
+    await db.commit()
     return db_income
 
 # Expense operations
-def get_expenses(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Expense).offset(skip).limit(limit).all()
+async def get_expenses(db: AsyncSession, cursor_id: Optional[int] = None, limit: int = 100):
+    # Keyset pagination: newest first, resuming below the last id seen
+    if cursor_id is None:
+        result = await db.execute(_EXPENSES_FIRST_PAGE, {"limit": limit})
+    else:
+        result = await db.execute(_EXPENSES_AFTER_CURSOR, {"cursor_id": cursor_id, "limit": limit})
+    return [dict(row) for row in result.mappings()]
 
-def create_expense(db: Session, expense: schemas.ExpenseCreate, user_id: int = 1):
-    db_expense = models.Expense(**expense.dict(), user_id=user_id)
-    db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
+async def create_expense(db: AsyncSession, expense: schemas.ExpenseCreate, user_id: int = 1):
+    # INSERT ... RETURNING gives back the new row without a follow-up SELECT
+    result = await db.execute(
+        insert(models.Expense).values(**expense.model_dump(), user_id=user_id).returning(models.Expense)
+    )
+    db_expense = result.scalar_one()
+    await db.commit()
     return db_expense
 
-def update_expense(db: Session, expense_id: int, expense_data: schemas.ExpenseUpdate):
-    db_expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
+async def update_expense(db: AsyncSession, expense_id: int, expense_data: schemas.ExpenseUpdate):
+    db_expense = await db.get(models.Expense, expense_id)
     if db_expense is None:
         return None
         
     # Update the expense object with new data
-    update_data = expense_data.dict(exclude_unset=True)
+    update_data = expense_data.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_expense, key, value)
     
-    db.commit()
-    db.refresh(db_expense)
+    await db.commit()
+    await db.refresh(db_expense)
     return db_expense
 
-def delete_expense(db: Session, expense_id: int):
-    db_expense = db.query(models.Expense).filter(models.Expense.id == expense_id).first()
+async def delete_expense(db: AsyncSession, expense_id: int):
+    db_expense = await db.get(models.Expense, expense_id)
     if db_expense is None:
         return None
-    db.delete(db_expense)
-    db.commit()
-    return db_expense
\ No newline at end of file
+    await db.delete(db_expense)
+    await db.commit()
+    return db_expense
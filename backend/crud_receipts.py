@@ -1,13 +1,33 @@
 from typing import List, Optional, Dict, Any
+import contextlib
 import os
 from datetime import date, datetime
-from sqlalchemy.orm import Session
-import json
+from sqlalchemy import bindparam, func, insert, select
+from sqlalchemy.orm import Session, selectinload
 
 from models import Receipt, ExtractedTransaction, Expense
 import schemas
 
-async def create_receipt(
+# Hot lookups (status polling, ownership checks) built once so the compiled cache always hits
+_RECEIPT_FOR_USER = select(Receipt).where(
+    Receipt.id == bindparam("receipt_id"), Receipt.user_id == bindparam("user_id")
+)
+_RECEIPT_OWNER = select(Receipt.user_id).where(Receipt.id == bindparam("receipt_id"))
+# Receipt list pages walk (user_id, id) backwards; transactions come in one extra IN query
+# per page instead of one per receipt
+_RECEIPTS_FIRST_PAGE = select(Receipt).options(selectinload(Receipt.extracted_transactions)).where(
+    Receipt.user_id == bindparam("user_id")
+).order_by(Receipt.id.desc()).limit(bindparam("limit"))
+_RECEIPTS_AFTER_CURSOR = select(Receipt).options(selectinload(Receipt.extracted_transactions)).where(
+    Receipt.user_id == bindparam("user_id"), Receipt.id < bindparam("cursor_id")
+).order_by(Receipt.id.desc()).limit(bindparam("limit"))
+_RECEIPT_BY_DIGEST = select(Receipt).where(
+    Receipt.user_id == bindparam("user_id"), Receipt.content_sha256 == bindparam("content_sha256"),
+    Receipt.status == "completed"
+).order_by(Receipt.id)
+_TRANSACTION_BY_ID = select(ExtractedTransaction).where(ExtractedTransaction.id == bindparam("transaction_id"))
+
+def create_receipt(
     db: Session, 
     user_id: int, 
     filename: str, 
@@ -17,7 +37,8 @@ async def create_receipt(
     receipt_total: Optional[float] = None,
     status: Optional[str] = "pending",
     progress: Optional[float] = 0.0,
-    error_message: Optional[str] = None
+    error_message: Optional[str] = None,
+    content_sha256: Optional[str] = None
 ) -> Receipt:
     """Create a new receipt record in the database."""
     db_receipt = Receipt(
@@ -31,20 +52,96 @@ async def create_receipt(
         user_id=user_id,
         status=status,
         progress=progress,
-        error_message=error_message
+        error_message=error_message,
+        content_sha256=content_sha256
     )
     db.add(db_receipt)
     db.commit()
     db.refresh(db_receipt)
     return db_receipt
 
-def get_receipts(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[Receipt]:
-    """Get all receipts for a user."""
-    return db.query(Receipt).filter(Receipt.user_id == user_id).offset(skip).limit(limit).all()
+def _extracted_transaction_rows(receipt_id: int, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fill in defaults for extracted transaction rows destined for a Core INSERT."""
+    today = datetime.now().date()
+    return [
+        {
+            "receipt_id": receipt_id,
+            "description": row["description"],
+            "amount": row["amount"],
+            "date": row.get("date") or today,
+            "category": row.get("category") or "Miscellaneous",
+            "verified": False,
+            "user_verified": False,
+            "added_to_expenses": False,
+            "original_text": row.get("original_text"),
+            "confidence_score": row.get("confidence_score", 1.0)
+        }
+        for row in rows
+    ]
+
+def create_receipt_with_transactions(
+    db: Session,
+    user_id: int,
+    receipt_fields: Dict[str, Any],
+    transactions: List[Dict[str, Any]]
+) -> Receipt:
+    """Create an already-processed receipt and its extracted transactions with a single commit."""
+    db_receipt = Receipt(
+        processed=True,
+        verified=False,
+        user_id=user_id,
+        status="completed",
+        progress=1.0,
+        **receipt_fields
+    )
+    db.add(db_receipt)
+    # Flush to get the receipt id for the transaction rows without committing
+    db.flush()
+    
+    if transactions:
+        db.execute(insert(ExtractedTransaction), _extracted_transaction_rows(db_receipt.id, transactions))
+    db.commit()
+    return db_receipt
+
+def get_receipts(db: Session, user_id: int, cursor_id: Optional[int] = None, limit: int = 100) -> List[Receipt]:
+    """Get a page of receipts for a user, newest first, starting below cursor_id."""
+    if cursor_id is None:
+        result = db.execute(_RECEIPTS_FIRST_PAGE, {"user_id": user_id, "limit": limit})
+    else:
+        result = db.execute(_RECEIPTS_AFTER_CURSOR, {"user_id": user_id, "cursor_id": cursor_id, "limit": limit})
+    return result.scalars().all()
 
 def get_receipt(db: Session, receipt_id: int, user_id: int) -> Optional[Receipt]:
     """Get a specific receipt by ID for a user."""
-    return db.query(Receipt).filter(Receipt.id == receipt_id, Receipt.user_id == user_id).first()
+    return db.execute(_RECEIPT_FOR_USER, {"receipt_id": receipt_id, "user_id": user_id}).scalars().first()
+
+def find_duplicate_receipt(
+    db: Session,
+    user_id: int,
+    content_sha256: str,
+    exclude_id: Optional[int] = None
+) -> Optional[Receipt]:
+    """Find the user's earliest completed receipt with the same file content, ignoring exclude_id.
+
+    Failed or still-processing receipts never match, so re-uploading their file processes it again.
+    """
+    for receipt in db.execute(_RECEIPT_BY_DIGEST, {"user_id": user_id, "content_sha256": content_sha256}).scalars():
+        if receipt.id != exclude_id:
+            return receipt
+    return None
+
+def set_receipt_digest(db: Session, receipt_id: int, content_sha256: str) -> None:
+    """Record the content digest of a receipt's file."""
+    db.query(Receipt).filter(Receipt.id == receipt_id).update(
+        {Receipt.content_sha256: content_sha256}, synchronize_session=False
+    )
+    db.commit()
+
+def get_receipt_owner(db: Session, receipt_id: int) -> Optional[int]:
+    """Get the id of the user who owns a receipt, or None if it doesn't exist."""
+    # Not cached per process: ids can be reused after a delete handled by another worker,
+    # and a stale owner would expose that user's status. The primary-key lookup is cheap.
+    return db.execute(_RECEIPT_OWNER, {"receipt_id": receipt_id}).scalar()
 
 def update_receipt(
     db: Session, 
@@ -65,49 +162,24 @@ def delete_receipt(db: Session, receipt_id: int, user_id: int) -> bool:
     """Delete a receipt and its associated extracted transactions."""
     db_receipt = get_receipt(db, receipt_id, user_id)
     if db_receipt:
-        # Delete associated extracted transactions
+        file_path = db_receipt.file_path
+
+        # Delete associated extracted transactions in bulk
         db.query(ExtractedTransaction).filter(
             ExtractedTransaction.receipt_id == receipt_id
-        ).delete()
-        
-        # Delete receipt file if it exists
-        if os.path.exists(db_receipt.file_path):
-            os.remove(db_receipt.file_path)
-            
+        ).delete(synchronize_session=False)
+
         # Delete receipt from database
         db.delete(db_receipt)
         db.commit()
+
+        # Delete receipt file once the transaction is closed
+        if file_path:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(file_path)
         return True
     return False
 
-async def create_extracted_transaction(
-    db: Session,
-    receipt_id: int,
-    description: str,
-    amount: float,
-    date: Optional[date] = None,
-    category: Optional[str] = None,
-    original_text: Optional[str] = None,
-    confidence_score: Optional[float] = 1.0
-) -> ExtractedTransaction:
-    """Create a new extracted transaction from a receipt."""
-    db_transaction = ExtractedTransaction(
-        description=description,
-        amount=amount,
-        date=date or datetime.now().date(),
-        category=category or "Miscellaneous",
-        verified=False,
-        user_verified=False,
-        added_to_expenses=False,
-        receipt_id=receipt_id,
-        original_text=original_text,
-        confidence_score=confidence_score
-    )
-    db.add(db_transaction)
-    db.commit()
-    db.refresh(db_transaction)
-    return db_transaction
-
 def get_extracted_transactions(db: Session, receipt_id: int) -> List[ExtractedTransaction]:
     """Get all extracted transactions for a receipt."""
     return db.query(ExtractedTransaction).filter(
@@ -168,20 +240,27 @@ def add_transaction_to_expenses(
         user_id=user_id
     )
     
+    # Flush to get the expense id without committing yet
     db.add(db_expense)
-    db.commit()
-    db.refresh(db_expense)
+    db.flush()
     
     # Update transaction to mark it as added to expenses
     db_transaction.added_to_expenses = True
     db_transaction.expense_id = db_expense.id
     db.commit()
+    db.refresh(db_expense)
     
     return db_expense
 
 def get_transaction(db: Session, transaction_id: int) -> Optional[ExtractedTransaction]:
     """Get a specific transaction by ID."""
-    return db.query(ExtractedTransaction).filter(ExtractedTransaction.id == transaction_id).first()
+    return db.execute(_TRANSACTION_BY_ID, {"transaction_id": transaction_id}).scalars().first()
+
+def _seconds_since(db: Session, column):
+    """SQL expression for the number of seconds elapsed since a timestamp column."""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.strftime('%s', 'now') - func.strftime('%s', column)
+    return func.extract('epoch', func.now() - column)
 
 def update_receipt_status(db: Session, receipt_id: int, status: str, progress: float = None, error_message: str = None) -> Optional[Receipt]:
     """Update a receipt's processing status."""
@@ -197,23 +276,30 @@ def update_receipt_status(db: Session, receipt_id: int, status: str, progress: f
             
         if status == "completed":
             db_receipt.processed = True
-            db_receipt.processing_time = datetime.now().timestamp() - db_receipt.created_at.timestamp()
+            # Let the database compute the elapsed time in the same UPDATE
+            db_receipt.processing_time = _seconds_since(db, Receipt.created_at)
             
         db.commit()
         db.refresh(db_receipt)
     return db_receipt
 
+def bulk_update_receipt_status(db: Session, receipt_ids: List[int], status: str) -> int:
+    """Set the processing status of many receipts in a single UPDATE."""
+    if not receipt_ids:
+        return 0
+    updated = db.query(Receipt).filter(Receipt.id.in_(receipt_ids)).update(
+        {"status": status}, synchronize_session=False
+    )
+    db.commit()
+    return updated
+
 def record_feedback(db: Session, receipt_id: int, user_id: int, feedback_data: Dict[str, Any]) -> Optional[Receipt]:
     """Record user feedback on receipt processing quality."""
     db_receipt = get_receipt(db, receipt_id, user_id)
     if db_receipt:
-        # If feedback already exists, update it rather than replacing
-        current_feedback = db_receipt.feedback or {}
-        if isinstance(current_feedback, str):
-            try:
-                current_feedback = json.loads(current_feedback)
-            except:
-                current_feedback = {}
+        # If feedback already exists, update it rather than replacing.
+        # The JSON column returns a dict; copy it so the change is detected on flush.
+        current_feedback = dict(db_receipt.feedback or {})
         
         # Merge new feedback with existing feedback
         current_feedback.update(feedback_data)
@@ -230,12 +316,7 @@ def update_transaction_with_feedback(db: Session, transaction_id: int, feedback:
     transaction = get_transaction(db, transaction_id)
     if transaction:
         # Record correction history
-        history = transaction.correction_history or {}
-        if isinstance(history, str):
-            try:
-                history = json.loads(history)
-            except:
-                history = {}
+        history = dict(transaction.correction_history or {})
         
         timestamp = datetime.now().isoformat()
         history[timestamp] = {
@@ -257,7 +338,7 @@ def update_transaction_with_feedback(db: Session, transaction_id: int, feedback:
             
         if "correct_date" in feedback and feedback["correct_date"]:
             if isinstance(feedback["correct_date"], str):
-                transaction.date = datetime.strptime(feedback["correct_date"], "%Y-%m-%d").date()
+                transaction.date = date.fromisoformat(feedback["correct_date"])
             else:
                 transaction.date = feedback["correct_date"]
                 
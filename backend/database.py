@@ -1,5 +1,7 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -13,15 +15,68 @@ DATABASE_URL = os.getenv(
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# Same database through an asyncio driver, for endpoints that await their queries
+if DATABASE_URL.startswith("sqlite:"):
+    ASYNC_DATABASE_URL = DATABASE_URL.replace("sqlite:", "sqlite+aiosqlite:", 1)
+elif DATABASE_URL.startswith("postgresql:"):
+    ASYNC_DATABASE_URL = DATABASE_URL.replace("postgresql:", "postgresql+asyncpg:", 1)
+else:
+    ASYNC_DATABASE_URL = DATABASE_URL
+
+# Compiled-statement cache shared by every query issued through the engines
+QUERY_CACHE_SIZE = 1200
+
 # Create engine with appropriate configs
 if DATABASE_URL.startswith("sqlite"):
+    if ":memory:" in DATABASE_URL:
+        # Each connection would get its own in-memory database, so keep the defaults
+        sqlite_pool_options = {}
+    else:
+        # Keep a few file connections open across requests instead of reconnecting
+        sqlite_pool_options = {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_timeout": 30,
+        }
     engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
+        DATABASE_URL, connect_args={"check_same_thread": False},
+        query_cache_size=QUERY_CACHE_SIZE,
+        poolclass=QueuePool if sqlite_pool_options else None, **sqlite_pool_options
+    )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        query_cache_size=QUERY_CACHE_SIZE,
+        poolclass=AsyncAdaptedQueuePool if sqlite_pool_options else None, **sqlite_pool_options
     )
 else:
-    engine = create_engine(DATABASE_URL)
+    # Size the pool for concurrent requests and recycle stale server connections
+    pool_options = {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "20")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "40")),
+        "pool_timeout": 30,
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "query_cache_size": QUERY_CACHE_SIZE,
+    }
+    engine = create_engine(DATABASE_URL, **pool_options)
+    async_engine = create_async_engine(ASYNC_DATABASE_URL, **pool_options)
+
+# Tune every new SQLite connection once: WAL so readers don't block the writer,
+# NORMAL sync (safe under WAL) and memory-mapped reads with a 64 MiB page cache
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
@@ -31,4 +86,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
\ No newline at end of file
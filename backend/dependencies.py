@@ -2,7 +2,10 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
+from typing import Dict, Tuple
 from jose import JWTError, jwt
+import threading
+import time
 
 from database import get_db
 import models
@@ -10,8 +13,36 @@ import auth
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
 
-# Get the current user based on the token
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+# Short-lived cache of authenticated users keyed by email -> (user, expires_at).
+# Cached rows are detached from their session; only column attributes such as
+# id and email should be read from them. The cache is per process and the TTL is
+# the only way entries expire, so a changed user row can be served stale for up
+# to USER_CACHE_TTL_SECONDS.
+USER_CACHE_TTL_SECONDS = 60
+USER_CACHE_MAX_SIZE = 10_000
+_user_cache: Dict[str, Tuple[models.User, float]] = {}
+# get_current_user runs on threadpool threads, so eviction and insertion are serialized
+_user_cache_lock = threading.Lock()
+
+def _get_user_by_email(db: Session, email: str):
+    now = time.time()
+    entry = _user_cache.get(email)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user is not None:
+        # Detach so later commits in this session don't expire the cached row
+        db.expunge(user)
+        with _user_cache_lock:
+            if len(_user_cache) >= USER_CACHE_MAX_SIZE:
+                _user_cache.pop(next(iter(_user_cache)), None)
+            _user_cache[email] = (user, now + USER_CACHE_TTL_SECONDS)
+    return user
+
+# Get the current user based on the token. A plain def so FastAPI runs the
+# blocking session query in its threadpool instead of on the event loop.
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -24,7 +55,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         
     try:
         # Verify the token
-        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+        payload = auth.decode_access_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -32,7 +63,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         raise credentials_exception
         
     # Find the user in the database
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = _get_user_by_email(db, email)
     if user is None:
         raise credentials_exception
         
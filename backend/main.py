@@ -1,31 +1,37 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import FileResponse, ORJSONResponse
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 import os
-import shutil
-from pathlib import Path
+import logging
+import secrets
+from pathlib import Path, PurePosixPath
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.parser import ParseFailedException
+from streaming_form_data.targets import FileTarget
 
 import models
 import schemas
 import crud
 import auth
-from database import SessionLocal, engine
+from database import get_async_db
+
+logger = logging.getLogger(__name__)
 
 # Try to import routers, but don't fail if dependencies are missing
 try:
     from routers import receipts
     has_receipts_router = True
-    print("Receipts router loaded successfully")
+    logger.info("Receipts router loaded successfully")
 except ImportError as e:
     has_receipts_router = False
-    print(f"Warning: Receipt processing disabled due to missing dependencies: {e}")
-    print("Running in demo mode with limited functionality")
-
-models.Base.metadata.create_all(bind=engine)
+    logger.warning("Receipt processing disabled due to missing dependencies: %s", e)
+    logger.warning("Running in demo mode with limited functionality")
 
-app = FastAPI(title="Financial Tracker API")
+app = FastAPI(title="Financial Tracker API", default_response_class=ORJSONResponse)
 
 # Configure CORS - Allow specific origins for authentication to work properly
 app.add_middleware(
@@ -38,8 +44,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With"],
-    expose_headers=["Content-Length", "X-Total-Count"],
-    max_age=600  # Cache preflight requests for 10 minutes
+    expose_headers=["Content-Length", "X-Total-Count", "X-Next-Cursor"],
+    max_age=86400  # Cache preflight requests for 24 hours
 )
 
 # Setup upload directory
@@ -51,23 +57,49 @@ UPLOAD_DIR.mkdir(exist_ok=True)
 async def health_check():
     return {"status": "ok", "version": "1.0", "demo_mode": auth.DEMO_MODE}
 
-# Mount the upload directory as a static file server
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# When fronted by nginx, set this to an internal location mapped to the upload
+# directory so nginx delivers attachments with sendfile() instead of Python
+UPLOADS_ACCEL_REDIRECT_PREFIX = os.getenv("UPLOADS_ACCEL_REDIRECT_PREFIX")
+UPLOAD_ROOT = UPLOAD_DIR.resolve()
+# Stored filenames carry a random hex suffix, so a URL's content never changes
+UPLOAD_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Serve files from the upload directory
+@app.get("/uploads/{file_path:path}")
+async def serve_upload(file_path: str, request: Request):
+    path = (UPLOAD_ROOT / file_path).resolve()
+    if UPLOAD_ROOT not in path.parents or not path.is_file():
+        raise HTTPException(status_code=404, detail="Not Found")
+
+    etag = f'"{path.stat().st_mtime_ns:x}"'
+    headers = {"Cache-Control": UPLOAD_CACHE_CONTROL, "ETag": etag}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in if_none_match or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+
+    if UPLOADS_ACCEL_REDIRECT_PREFIX:
+        relative_path = path.relative_to(UPLOAD_ROOT).as_posix()
+        headers["X-Accel-Redirect"] = f"{UPLOADS_ACCEL_REDIRECT_PREFIX.rstrip('/')}/{relative_path}"
+        return Response(headers=headers)
+    return FileResponse(path, headers=headers)
 
 # Include routers
 if 'has_receipts_router' in globals() and has_receipts_router:
     app.include_router(receipts.router, prefix="/receipts", tags=["receipts"])
-    print("Receipts router added to the API")
+    logger.info("Receipts router added to the API")
 else:
-    print("Receipts router not available, running with limited functionality")
+    logger.warning("Receipts router not available, running with limited functionality")
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Whole-page (de)serializers so list endpoints validate and encode in one pass
+_INCOMES_ADAPTER = TypeAdapter(List[schemas.Income])
+_EXPENSES_ADAPTER = TypeAdapter(List[schemas.Expense])
+
+def page_response(adapter: TypeAdapter, rows: List[dict], limit: int) -> Response:
+    response = Response(content=adapter.dump_json(adapter.validate_python(rows)), media_type="application/json")
+    # A full page means there may be more rows below the last id returned
+    if rows and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return response
 
 # Sample endpoint to test the API
 @app.get("/")
@@ -76,95 +108,116 @@ def read_root():
 
 # Income endpoints
 @app.post("/incomes/", response_model=schemas.Income)
-def create_income(income: schemas.IncomeCreate, db: Session = Depends(get_db)):
+async def create_income(income: schemas.IncomeCreate, db: AsyncSession = Depends(get_async_db)):
     # Hardcode user_id=1 temporarily for testing purposes
-    return crud.create_income(db=db, income=income, user_id=1)
+    return await crud.create_income(db=db, income=income, user_id=1)
 
-@app.get("/incomes/", response_model=List[schemas.Income])
+@app.get("/incomes/", response_model=None, responses={200: {"model": List[schemas.Income]}})
 async def read_incomes(
-    skip: int = 0,
+    cursor_id: Optional[int] = None,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Temporarily bypass authentication for testing
     # Return all incomes
-    return crud.get_incomes(db, skip=skip, limit=limit)
+    incomes = await crud.get_incomes(db, cursor_id=cursor_id, limit=limit)
+    return page_response(_INCOMES_ADAPTER, incomes, limit)
 
 @app.put("/incomes/{income_id}", response_model=schemas.Income)
-def update_income(income_id: int, income: schemas.IncomeUpdate, db: Session = Depends(get_db)):
-    db_income = crud.update_income(db, income_id=income_id, income_data=income)
+async def update_income(income_id: int, income: schemas.IncomeUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_income = await crud.update_income(db, income_id=income_id, income_data=income)
     if db_income is None:
         raise HTTPException(status_code=404, detail="Income not found")
     return db_income
 
 @app.delete("/incomes/{income_id}", response_model=schemas.Income)
-def delete_income(income_id: int, db: Session = Depends(get_db)):
-    db_income = crud.delete_income(db, income_id=income_id)
+async def delete_income(income_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_income = await crud.delete_income(db, income_id=income_id)
     if db_income is None:
         raise HTTPException(status_code=404, detail="Income record not found")
     return db_income
 
 # Expense endpoints
-@app.post("/upload-attachment/")
-async def upload_attachment(
-    file: UploadFile = File(...)
-):
-    # Create a unique filename to avoid collisions
-    unique_filename = f"{Path(file.filename).stem}_{os.urandom(4).hex()}{Path(file.filename).suffix}"
-    file_path = UPLOAD_DIR / unique_filename
-    
-    # Save the uploaded file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+# The body is parsed by hand, so describe the multipart file field for the OpenAPI docs
+ATTACHMENT_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["file"],
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                }
+            }
+        },
+    }
+}
+
+@app.post("/upload-attachment/", openapi_extra=ATTACHMENT_REQUEST_BODY)
+async def upload_attachment(request: Request):
+    # Parse the multipart body as it arrives and write the file part straight into
+    # the upload directory, skipping UploadFile's spooled temporary copy
+    partial_path = UPLOAD_DIR / f".{secrets.token_hex(8)}.part"
+    file_target = FileTarget(str(partial_path))
+
+    try:
+        parser = StreamingFormDataParser(headers=request.headers)
+        parser.register("file", file_target)
+        async for chunk in request.stream():
+            await run_in_threadpool(parser.data_received, chunk)
+    except (ParseFailedException, ValueError):
+        # Missing or non-multipart Content-Type, or a malformed body
+        partial_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body with a file field")
+    except Exception:
+        partial_path.unlink(missing_ok=True)
+        raise
+
+    if not file_target.multipart_filename or not partial_path.exists():
+        partial_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="No file uploaded")
+
+    # Create a unique filename to avoid collisions. Parse the name once, keeping only
+    # its final component so client-supplied directories (or "..") are dropped.
+    original_name = PurePosixPath(file_target.multipart_filename.replace("\\", "/"))
+    unique_filename = f"{original_name.stem}_{secrets.token_hex(4)}{original_name.suffix}"
+    os.replace(partial_path, UPLOAD_DIR / unique_filename)
     
-    return {"filename": file.filename, "stored_filename": unique_filename, "path": f"/uploads/{unique_filename}"}
+    return {"filename": file_target.multipart_filename, "stored_filename": unique_filename, "path": f"/uploads/{unique_filename}"}
 
 @app.post("/expenses/", response_model=schemas.Expense)
-def create_expense(expense: schemas.ExpenseCreate = None, db: Session = Depends(get_db)):
+async def create_expense(expense: schemas.ExpenseCreate = None, db: AsyncSession = Depends(get_async_db)):
     # Hardcode user_id=1 temporarily for testing purposes
-    return crud.create_expense(db=db, expense=expense, user_id=1)
+    return await crud.create_expense(db=db, expense=expense, user_id=1)
 
-@app.get("/expenses/", response_model=List[schemas.Expense])
-def read_expenses(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    expenses = crud.get_expenses(db, skip=skip, limit=limit)
-    return expenses
+@app.get("/expenses/", response_model=None, responses={200: {"model": List[schemas.Expense]}})
+async def read_expenses(cursor_id: Optional[int] = None, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    expenses = await crud.get_expenses(db, cursor_id=cursor_id, limit=limit)
+    return page_response(_EXPENSES_ADAPTER, expenses, limit)
 
 @app.put("/expenses/{expense_id}", response_model=schemas.Expense)
-def update_expense(expense_id: int, expense: schemas.ExpenseUpdate, db: Session = Depends(get_db)):
-    db_expense = crud.update_expense(db, expense_id=expense_id, expense_data=expense)
+async def update_expense(expense_id: int, expense: schemas.ExpenseUpdate, db: AsyncSession = Depends(get_async_db)):
+    db_expense = await crud.update_expense(db, expense_id=expense_id, expense_data=expense)
     if db_expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     return db_expense
 
 @app.delete("/expenses/{expense_id}", response_model=schemas.Expense)
-def delete_expense(expense_id: int, db: Session = Depends(get_db)):
-    db_expense = crud.delete_expense(db, expense_id=expense_id)
+async def delete_expense(expense_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_expense = await crud.delete_expense(db, expense_id=expense_id)
     if db_expense is None:
         raise HTTPException(status_code=404, detail="Expense not found")
     return db_expense
 
-from fastapi.responses import JSONResponse
-from fastapi.middleware.cors import CORSMiddleware
-
-@app.options("/auth/google")
-async def auth_google_options():
-    # Handle OPTIONS preflight request for the auth endpoint
-    headers = {
-        "Access-Control-Allow-Origin": "http://localhost:3000",
-        "Access-Control-Allow-Methods": "POST, OPTIONS",
-        "Access-Control-Allow-Headers": "Content-Type, Authorization, Accept, Origin, X-Requested-With",
-        "Access-Control-Allow-Credentials": "true",
-    }
-    return JSONResponse(content={}, headers=headers)
-
 @app.post("/auth/google")
-async def google_auth(token: schemas.TokenData, db: Session = Depends(get_db)):
-    user_data = auth.verify_google_token(token.token)
+async def google_auth(token: schemas.TokenData, db: AsyncSession = Depends(get_async_db)):
+    user_data = await auth.verify_google_token(token.token)
     
     # Check if user exists, if not create new user
-    db_user = crud.get_user_by_email(db, email=user_data["email"])
+    db_user = await crud.get_user_by_email(db, email=user_data["email"])
     if not db_user:
-        db_user = crud.create_user(
+        db_user = await crud.create_user(
             db,
             email=user_data["email"],
             google_id=user_data["sub"],
@@ -177,28 +230,36 @@ async def google_auth(token: schemas.TokenData, db: Session = Depends(get_db)):
         data={"sub": user_data["email"]}
     )
     
-    # Create response with custom headers to ensure CORS works
+    # CORS headers are added by CORSMiddleware for every allowed origin
     response_data = {
         "access_token": access_token,
         "token_type": "bearer",
         "demo_mode": auth.DEMO_MODE,
     }
     
-    # Create response with CORS headers
-    headers = {
-        "Access-Control-Allow-Origin": "http://localhost:3000",
-        "Access-Control-Allow-Credentials": "true",
-    }
-    
     # Add demo mode message if needed
     if auth.DEMO_MODE:
         response_data["message"] = "Using demo mode authentication"
         
-    # Return the response with headers
-    return JSONResponse(content=response_data, headers=headers)
+    return response_data
 
 # Run the app on startup
 if __name__ == "__main__":
     import uvicorn
+    # Schema changes go through Alembic; RUN_SCHEMA_SYNC=1 creates missing tables directly
+    # (e.g. for a throwaway dev database). It runs here, once, before the workers start,
+    # rather than in a startup hook that every worker process would run at the same time
+    if os.getenv("RUN_SCHEMA_SYNC") == "1":
+        from database import engine
+        models.Base.metadata.create_all(bind=engine)
     print("Starting server at http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # An import string is required for uvicorn to spawn multiple workers
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", "2")),
+        log_level="warning",
+    )
\ No newline at end of file
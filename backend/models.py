@@ -1,9 +1,13 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, Date, DateTime, JSON
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, Numeric, String, Float, Date, DateTime, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from database import Base
 
+# Binary jsonb on PostgreSQL (GIN-indexable), plain JSON elsewhere
+JSONDocument = JSON().with_variant(JSONB(), "postgresql")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -21,29 +25,39 @@ class Income(Base):
     __tablename__ = "incomes"
 
     id = Column(Integer, primary_key=True, index=True)
-    amount = Column(Float)
-    description = Column(String)
+    amount = Column(Numeric(12, 2))  # Exact currency amount
+    description = Column(String(500))
     date = Column(Date)
-    category = Column(String)
+    category = Column(String(64))
     user_id = Column(Integer, ForeignKey("users.id"))
 
-    owner = relationship("User", back_populates="incomes")
+    owner = relationship("User", back_populates="incomes", lazy="raise")
+
+    __table_args__ = (
+        Index("ix_incomes_user_date", "user_id", "date"),
+        Index("ix_incomes_category", "category"),
+    )
 
 class Expense(Base):
     __tablename__ = "expenses"
 
     id = Column(Integer, primary_key=True, index=True)
-    amount = Column(Float)
-    description = Column(String)
+    amount = Column(Numeric(12, 2))  # Exact currency amount
+    description = Column(String(500))
     date = Column(Date)
-    category = Column(String)
+    category = Column(String(64))
     property_type = Column(String, nullable=True)
     tax_deductible = Column(Boolean, default=False)
     attachment_filename = Column(String, nullable=True)
     attachment_path = Column(String, nullable=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+
+    owner = relationship("User", back_populates="expenses", lazy="raise")
 
-    owner = relationship("User", back_populates="expenses")
+    __table_args__ = (
+        Index("ix_expenses_user_date", "user_id", "date"),
+        Index("ix_expenses_category", "category"),
+    )
 
 class Receipt(Base):
     __tablename__ = "receipts"
@@ -51,23 +65,31 @@ class Receipt(Base):
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String)
     file_path = Column(String)
-    merchant_name = Column(String, nullable=True)
+    merchant_name = Column(String(255), nullable=True)
     receipt_date = Column(Date, nullable=True)
     receipt_total = Column(Float, nullable=True)
     processed = Column(Boolean, default=False)
     verified = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=func.now())
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     # Fields for agentic workflow
     status = Column(String, default="pending")  # pending, processing, completed, failed
     error_message = Column(String, nullable=True)
     processing_time = Column(Float, nullable=True)  # Processing time in seconds
     progress = Column(Float, default=0.0)  # Processing progress from 0 to 1
-    feedback = Column(JSON, nullable=True)  # User feedback on processing quality
+    feedback = Column(JSONDocument, nullable=True)  # User feedback on processing quality
+    content_sha256 = Column(String(64), nullable=True)  # Hex digest of the file, for spotting re-uploads
     
-    owner = relationship("User", back_populates="receipts")
+    owner = relationship("User", back_populates="receipts", lazy="raise")
     extracted_transactions = relationship("ExtractedTransaction", back_populates="receipt")
 
+    __table_args__ = (
+        Index("ix_receipts_user_status", "user_id", "status"),
+        Index("ix_receipts_user_id_id", "user_id", "id"),
+        Index("ix_receipts_user_content_sha256", "user_id", "content_sha256"),
+        Index("ix_receipts_feedback_gin", "feedback", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
 class ExtractedTransaction(Base):
     __tablename__ = "extracted_transactions"
     
@@ -79,11 +101,17 @@ class ExtractedTransaction(Base):
     verified = Column(Boolean, default=False)
     added_to_expenses = Column(Boolean, default=False)
     expense_id = Column(Integer, ForeignKey("expenses.id"), nullable=True)
-    receipt_id = Column(Integer, ForeignKey("receipts.id"))
+    receipt_id = Column(Integer, ForeignKey("receipts.id"), index=True)
     # Fields for agentic workflow
     user_verified = Column(Boolean, default=False)  # Indicates user has reviewed and verified
     confidence_score = Column(Float, default=1.0)  # AI confidence in extraction (0-1)
     original_text = Column(String, nullable=True)  # Original text from receipt for this item
-    correction_history = Column(JSON, nullable=True)  # History of corrections made
+    correction_history = Column(JSONDocument, nullable=True)  # History of corrections made
     
-    receipt = relationship("Receipt", back_populates="extracted_transactions")
\ No newline at end of file
+    receipt = relationship("Receipt", back_populates="extracted_transactions")
+
+    __table_args__ = (
+        Index(
+            "ix_extracted_transactions_correction_history_gin", "correction_history", postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+    )
\ No newline at end of file
@@ -1,12 +1,26 @@
 import os
 import io
+import re
+import shutil
 import tempfile
 import json
 from typing import List, Dict, Any, Optional, Tuple, Callable
-from datetime import datetime
-from functools import lru_cache
+from datetime import date, datetime
 import asyncio
+import contextlib
+import hashlib
 import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tesseract's OpenMP threads contend with each other; parallelize across pages instead.
+# Must be set before libtesseract is loaded.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
 
 # Try importing required libraries, but don't fail if they're not available
 has_required_libraries = True
@@ -18,10 +32,21 @@ try:
     from pdf2image import convert_from_bytes
 except ImportError as e:
     has_required_libraries = False
-    print(f"Warning: Some receipt processing libraries not available: {e}")
-    print("Receipt processing features will be limited to demo mode")
+    logger.warning("Some receipt processing libraries not available: %s", e)
+    logger.warning("Receipt processing features will be limited to demo mode")
 
+# tesserocr drives libtesseract in-process; fall back to the pytesseract CLI wrapper without it
+try:
+    import tesserocr
+    has_tesserocr = True
+except ImportError:
+    has_tesserocr = False
+
+import aiofiles
+import orjson
 from fastapi import UploadFile, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 
 from langchain.prompts import ChatPromptTemplate
@@ -33,9 +58,92 @@ from langchain.tools import tool
 from langchain.chains import LLMChain
 from langchain.memory import ConversationBufferMemory
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+# OpenCV preprocessing is optional; OCR uses the raw image without it
+try:
+    import cv2
+    import numpy as np
+    has_opencv = True
+except ImportError:
+    has_opencv = False
+
+# Images shorter than this are upscaled before OCR so glyphs have enough pixels
+MIN_OCR_IMAGE_HEIGHT = int(os.getenv("OCR_MIN_IMAGE_HEIGHT", "1000"))
+# Tesseract time grows with pixel count; camera photos are downscaled to this long edge
+MAX_OCR_IMAGE_EDGE = int(os.getenv("OCR_MAX_IMAGE_EDGE", "1800"))
+
+# pypdfium2 renders PDF pages in-process; pdf2image (pdftoppm + temp files) is the fallback
+try:
+    import pypdfium2 as pdfium
+    has_pdfium = True
+except ImportError:
+    has_pdfium = False
+
+# diskcache persists LLM parses across restarts; without it every receipt calls the API
+try:
+    import diskcache
+    has_diskcache = True
+except ImportError:
+    has_diskcache = False
+
+LLM_CACHE_DIR = os.getenv("RECEIPT_LLM_CACHE_DIR", ".receipt_llm_cache")
+LLM_CACHE_SIZE_LIMIT = 1024 ** 3  # 1 GiB
+# Shorter OCR output is most likely noise and not worth a cache entry
+LLM_CACHE_MIN_TEXT_LENGTH = 50
+
+def _spool_upload(source) -> str:
+    """Copy an upload's file object to a named temp file and return its path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".receipt") as spool:
+        shutil.copyfileobj(source, spool)
+        return spool.name
+
+# tiktoken gives exact prompt token counts; otherwise estimate ~4 characters per token
+try:
+    import tiktoken
+    has_tiktoken = True
+except ImportError:
+    has_tiktoken = False
+
+# OCR text beyond this many tokens is trimmed to its head and tail before the LLM call
+LLM_MAX_INPUT_TOKENS = 6000
+# Share of the token budget kept from each end of over-long text; merchant and totals sit at the edges
+LLM_TRUNCATE_EDGE_FRACTION = 0.4
+
+try:
+    import redis.asyncio as aioredis
+    has_redis = True
+except ImportError:
+    has_redis = False
+
+# Leading magic bytes of the formats receipts nearly always arrive in
+MIME_SIGNATURES = (
+    (b"%PDF", "application/pdf"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+def _sniff_mime(content: bytes) -> str:
+    """Detect a file's MIME type from its header, consulting libmagic only for unknown formats."""
+    for signature, mime_type in MIME_SIGNATURES:
+        if content.startswith(signature):
+            return mime_type
+    return magic.from_buffer(content[:4096], mime=True)
+
+# Resolution for rasterizing scanned PDF pages; 150 DPI is enough for receipt text
+PDF_RENDER_DPI = int(os.getenv("OCR_PDF_DPI", "150"))
+PDF_RENDER_SCALE = PDF_RENDER_DPI / 72  # pdfium renders at 72 DPI for scale 1
+
+def _render_pdf_page(pdf, page_index: int):
+    """Render a PDF page to a single-channel uint8 array."""
+    page = pdf[page_index]
+    try:
+        return page.render(scale=PDF_RENDER_SCALE, grayscale=True).to_numpy()
+    finally:
+        page.close()
+
+# Threads used to OCR the pages of one PDF; Tesseract releases the GIL while recognizing
+OCR_PAGE_WORKERS = min(4, os.cpu_count() or 1)
 
 # Define the pydantic models for the extracted transactions
 class Transaction(BaseModel):
@@ -62,12 +170,111 @@ class ReceiptData(BaseModel):
     receipt_total: Optional[float] = Field(description="Total amount on the receipt")
     transactions: List[Transaction] = Field(description="List of transactions found in the receipt")
 
+def _history_record(receipt_data: ReceiptData) -> Dict[str, Any]:
+    """Flatten parsed receipt data into plain dicts without pydantic's recursive .dict()"""
+    return {
+        "merchant_name": receipt_data.merchant_name,
+        "receipt_date": receipt_data.receipt_date,
+        "receipt_total": receipt_data.receipt_total,
+        "transactions": [
+            {
+                "description": transaction.description,
+                "amount": transaction.amount,
+                "date": transaction.date,
+                "category": transaction.category,
+            }
+            for transaction in receipt_data.transactions
+        ],
+    }
+
+# Receipt extraction prompt; a richer prompt that incorporates learning from user patterns
+RECEIPT_PROMPT_TEMPLATE = """
+        You are an intelligent agentic AI assistant specialized in extracting and analyzing information from receipts.
+        
+        Analyze this receipt text carefully and extract the following information:
+        1. Merchant name: Look for business names, logos, headers, or footers that identify the store or service provider.
+        2. Receipt date: Check for purchase dates or transaction dates in various formats and convert to YYYY-MM-DD format.
+        3. Receipt total amount: Look for 'total', 'grand total', 'amount paid', or the largest amount at the bottom.
+        4. List of transactions/items: Extract individual items, their descriptions, and their prices.
+        
+        If there are multiple items on the receipt, list each as a separate transaction.
+        Use your judgment to resolve ambiguities and apply domain knowledge to make intelligent decisions.
+        
+        When determining categories, think about the type of merchant and the items purchased to assign appropriate categories.
+        Learn from these patterns for categorization:
+        {category_patterns}
+        
+        Receipt text:
+        {receipt_text}
+        
+        Provide your answer in the following JSON format:
+        {{
+            "merchant_name": "string or null",
+            "receipt_date": "YYYY-MM-DD or null",
+            "receipt_total": number or null,
+            "transactions": [
+                {{
+                    "description": "Item description",
+                    "amount": number,
+                    "date": "YYYY-MM-DD or null",
+                    "category": "Category name"
+                }},
+                ...
+            ]
+        }}
+        """
+
+# With REDIS_URL set, processing history and feedback are shared by all workers;
+# otherwise each process keeps its own in-memory copy below
+REDIS_URL = os.getenv("REDIS_URL")
+REDIS_RECEIPTS_KEY = "receipts"
+REDIS_FEEDBACK_KEY = "receipt_feedback"
+REDIS_MERCHANT_KEY_PREFIX = "merchant:"
+REDIS_STATUS_KEY_PREFIX = "rcpt:"
+# Live status is only interesting while polling; the receipts table keeps the final state
+STATUS_TTL_SECONDS = 24 * 60 * 60
+
+CATEGORY_PATTERNS_FILE = 'category_patterns.json'
+# Feedback-driven pattern changes are written at most this often
+PATTERNS_FLUSH_DELAY_SECONDS = 2
+
 # In-memory cache for past processing results to learn from
 processing_history = {}
 
 # Feedback data store
 user_feedback_store = {}
 
+class ProcessingStatusStore:
+    """Live processing status per receipt, shared through Redis hashes when Redis is configured"""
+    
+    def __init__(self, redis=None):
+        self.redis = redis
+        self._local: Dict[int, Dict[str, Any]] = {}
+    
+    async def set(self, receipt_id: int, **fields: Any) -> None:
+        if self.redis is not None:
+            key = f"{REDIS_STATUS_KEY_PREFIX}{receipt_id}"
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hset(key, mapping={name: orjson.dumps(value) for name, value in fields.items()})
+                pipe.expire(key, STATUS_TTL_SECONDS)
+                await pipe.execute()
+            return
+        # Publish a fresh dict in one assignment so readers never see a half-updated entry
+        self._local[receipt_id] = {**self._local.get(receipt_id, {}), **fields}
+    
+    async def get(self, receipt_id: int) -> Optional[Dict[str, Any]]:
+        if self.redis is not None:
+            fields = await self.redis.hgetall(f"{REDIS_STATUS_KEY_PREFIX}{receipt_id}")
+            return {name.decode(): orjson.loads(value) for name, value in fields.items()} or None
+        return self._local.get(receipt_id)
+    
+    async def delete(self, receipt_id: int) -> None:
+        # Receipt ids can be reused after a delete; a new receipt must not inherit this status
+        if self.redis is not None:
+            await self.redis.delete(f"{REDIS_STATUS_KEY_PREFIX}{receipt_id}")
+            return
+        self._local.pop(receipt_id, None)
+
 class ReceiptProcessor:
     def __init__(self, openai_api_key: Optional[str] = None, model_name: Optional[str] = None):
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
@@ -88,6 +295,18 @@ class ReceiptProcessor:
         # Define the JSON output parser
         self.parser = JsonOutputParser(pydantic_model=ReceiptData)
         
+        # Tokenizer for sizing OCR text sent to the model
+        self._encoding = None
+        if has_tiktoken:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model_name)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        
+        # Parse the prompt template and wire the chain once per processor
+        self._prompt = ChatPromptTemplate.from_template(RECEIPT_PROMPT_TEMPLATE)
+        self._chain = self._prompt | self.llm | self.parser
+        
         # Create conversation memory for learning
         self.memory = ConversationBufferMemory(memory_key="chat_history")
         
@@ -96,13 +315,69 @@ class ReceiptProcessor:
         
         # Load categorization patterns based on past user behavior
         self.category_patterns = self._load_category_patterns()
+        self._compile_category_patterns()
+        self._patterns_dirty = False
+        self._patterns_flush_task = None
+        
+        # The tesserocr API isn't thread-safe, so each OCR thread loads its own engine once
+        self._tess_local = threading.local()
+        self._tess_apis = []
+        self._tess_apis_lock = threading.Lock()
+        
+        # Parsed LLM output keyed by receipt text hash, so re-uploads skip the API round trip
+        self._llm_cache = diskcache.Cache(LLM_CACHE_DIR, size_limit=LLM_CACHE_SIZE_LIMIT) if has_diskcache else None
+        
+        # Shared store for processing history and feedback across workers
+        self.redis = aioredis.from_url(REDIS_URL) if REDIS_URL and has_redis else None
+        if REDIS_URL and not has_redis:
+            logger.warning("REDIS_URL is set but the redis package is not installed; using in-process storage")
+        
+        # Live status of receipts being processed in the background
+        self.status_store = ProcessingStatusStore(self.redis)
+        
+        # Processing history grouped by merchant, plus insights computed from it
+        self._by_merchant: Dict[str, List[dict]] = {}
+        self._merchant_insights_cache: Dict[str, Dict[str, Any]] = {}
+        
+        # Threads for blocking text extraction so OCR doesn't stall the event loop
+        self._io_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="receipt-extract")
+        
+        # Threads for multi-page PDF OCR, started lazily on first use
+        self._ocr_executor = None
+        
+    def __del__(self):
+        for tess_api in getattr(self, "_tess_apis", []):
+            tess_api.End()
+        ocr_executor = getattr(self, "_ocr_executor", None)
+        if ocr_executor is not None:
+            ocr_executor.shutdown(wait=False)
+        io_executor = getattr(self, "_io_executor", None)
+        if io_executor is not None:
+            io_executor.shutdown(wait=False)
+    
+    def _get_ocr_executor(self) -> ThreadPoolExecutor:
+        if self._ocr_executor is None:
+            self._ocr_executor = ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix="receipt-ocr")
+        return self._ocr_executor
+    
+    def _get_tess_api(self):
+        """Return this thread's Tesseract engine, or None when tesserocr isn't installed"""
+        if not has_tesserocr:
+            return None
+        tess_api = getattr(self._tess_local, "api", None)
+        if tess_api is None:
+            tess_api = tesserocr.PyTessBaseAPI(lang="eng", psm=tesserocr.PSM.AUTO)
+            self._tess_local.api = tess_api
+            with self._tess_apis_lock:
+                self._tess_apis.append(tess_api)
+        return tess_api
         
     def _load_category_patterns(self) -> Dict[str, List[str]]:
         """Load learned categorization patterns from storage or use defaults"""
         try:
             # Try to load from a file if it exists
-            if os.path.exists('category_patterns.json'):
-                with open('category_patterns.json', 'r') as f:
+            if os.path.exists(CATEGORY_PATTERNS_FILE):
+                with open(CATEGORY_PATTERNS_FILE, 'r') as f:
                     return json.load(f)
         except Exception as e:
             logger.error(f"Error loading category patterns: {e}")
@@ -124,9 +399,6 @@ class ReceiptProcessor:
         tracking_id = receipt_id or hash(f"{file.filename}_{datetime.now().isoformat()}")
         
         try:
-            # Read file content
-            content = await file.read()
-            
             # Initial response to user
             response = {
                 "status": "processing",
@@ -134,25 +406,32 @@ class ReceiptProcessor:
                 "message": "Receipt uploaded and queued for processing"
             }
             
+            # The header is enough to tell the file type
+            mime_type = _sniff_mime(await file.read(4096))
+            await file.seek(0)
+            
             # If background_tasks provided, process asynchronously
             if background_tasks:
                 # Update receipt status to 'processing' in DB
                 if db and receipt_id:
                     self._update_receipt_status(db, receipt_id, "processing")
+                
+                # Spool to disk so the upload isn't held in memory until the task runs
+                content_path = await run_in_threadpool(_spool_upload, file.file)
                     
                 # Add to background tasks
                 background_tasks.add_task(
                     self._background_process_receipt,
-                    content,
+                    content_path,
                     file.filename,
-                    mime_type=magic.from_buffer(content, mime=True),
+                    mime_type=mime_type,
                     user_id=user_id,
                     db=db,
                     receipt_id=tracking_id
                 )
             else:
                 # Process immediately
-                mime_type = magic.from_buffer(content, mime=True)
+                content = await file.read()
                 receipt_data = await self._process_receipt_content(content, mime_type)
                 response = {
                     "status": "completed",
@@ -173,40 +452,72 @@ class ReceiptProcessor:
                 "message": f"Error processing receipt: {str(e)}"
             }
     
+    async def extract_receipt_data(self, file: UploadFile) -> ReceiptData:
+        """Process an uploaded receipt right away and return the parsed data; errors propagate"""
+        content = await file.read()
+        return await self._process_receipt_content(content, _sniff_mime(content[:4096]))
+    
     async def _process_receipt_content(self, content: bytes, mime_type: str) -> ReceiptData:
-        """Process receipt content synchronously"""
+        """Extract text off the event loop, then parse it with the LLM"""
         # Extract text based on file type
         if "pdf" in mime_type:
-            extracted_text = self._extract_text_from_pdf(content)
+            extract_text = self._extract_text_from_pdf
         elif "image" in mime_type:
-            extracted_text = self._extract_text_from_image(content)
+            extract_text = self._extract_text_from_image
         else:
             raise ValueError(f"Unsupported file type: {mime_type}. Please upload a PDF or image file.")
+        extracted_text = await asyncio.get_running_loop().run_in_executor(self._io_executor, extract_text, content)
             
         # Parse the extracted text using LLM
         receipt_data = await self._parse_receipt_text(extracted_text)
         
         return receipt_data
         
-    async def _background_process_receipt(self, content: bytes, filename: str, mime_type: str, 
+    async def _background_process_receipt(self, content_path: str, filename: str, mime_type: str, 
                                          user_id: int = None, db: Session = None, receipt_id: int = None):
-        """Process a receipt in the background"""
+        """Process a spooled receipt in the background, then remove the spool file"""
+        try:
+            return await self.process_receipt_background(content_path, filename, mime_type,
+                                                         user_id=user_id, db=db, receipt_id=receipt_id)
+        finally:
+            try:
+                os.unlink(content_path)
+            except FileNotFoundError:
+                pass
+    
+    async def process_receipt_background(self, file_path: str, filename: str, mime_type: str, 
+                                         user_id: int = None, db: Session = None, receipt_id: int = None):
+        """Process a receipt stored at file_path in the background"""
         try:
             # Log start of processing
             logger.info(f"Started background processing of receipt {filename} (ID: {receipt_id})")
             
+            # Read the file only now, so the bytes live just as long as processing does
+            async with aiofiles.open(file_path, "rb") as receipt_file:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(receipt_file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                content = await receipt_file.read()
+                # This was the one read that benefits from the page cache; later reads are rare
+                # archival fetches, so give the pages back instead of letting receipts pile up
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(receipt_file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            
             # Process the receipt
             receipt_data = await self._process_receipt_content(content, mime_type)
             
             # Store the processing results
             if user_id:
-                processing_history[f"{user_id}_{receipt_id}"] = receipt_data.dict()
+                await self._record_processing_result(f"{user_id}_{receipt_id}", _history_record(receipt_data))
             
             # Update the database if provided
             if db and receipt_id:
                 self._update_receipt_with_data(db, receipt_id, receipt_data)
                 self._update_receipt_status(db, receipt_id, "completed")
                 
+            if receipt_id:
+                await self.status_store.set(receipt_id, status="completed", progress=1.0,
+                                            message="Receipt processed successfully")
+            
             logger.info(f"Completed background processing of receipt {filename} (ID: {receipt_id})")
             
             # Return the processing results
@@ -215,6 +526,9 @@ class ReceiptProcessor:
         except Exception as e:
             logger.error(f"Error in background receipt processing: {str(e)}")
             
+            if receipt_id:
+                await self.status_store.set(receipt_id, status="error", message=str(e))
+            
             # Update status to error if DB connection available
             if db and receipt_id:
                 self._update_receipt_status(db, receipt_id, "error", error_message=str(e))
@@ -224,42 +538,114 @@ class ReceiptProcessor:
     
     def _extract_text_from_pdf(self, content: bytes) -> str:
         """Extract text from a PDF file using pdfplumber and OCR if needed."""
-        text = ""
+        page_texts = []
+        any_text = False
         
-        # First try with pdfplumber
+        # First try with pdfplumber, releasing each page's parsed objects once its text is out
         with io.BytesIO(content) as pdf_file:
             with pdfplumber.open(pdf_file) as pdf:
                 for page in pdf.pages:
-                    page_text = page.extract_text() or ""
-                    text += page_text + "\n"
+                    page_text = page.extract_text(x_tolerance=3, y_tolerance=3) or ""
+                    page.close()
+                    any_text = any_text or bool(page_text.strip())
+                    page_texts.append(page_text)
         
         # If no text was extracted, try OCR
-        if not text.strip():
-            text = self._ocr_pdf(content)
+        if not any_text:
+            return self._ocr_pdf(content)
             
-        return text
+        return "".join(page_text + "\n" for page_text in page_texts)
     
     def _ocr_pdf(self, content: bytes) -> str:
         """Use OCR to extract text from a PDF by converting it to images first."""
-        text = ""
+        if has_pdfium:
+            return self._ocr_pdf_pdfium(content)
         
-        # Convert PDF to images
+        # Render pages to files; each OCR thread opens its own page
         with tempfile.TemporaryDirectory() as path:
-            images = convert_from_bytes(content, output_folder=path)
-            
-            # Perform OCR on each image
-            for image in images:
-                text += pytesseract.image_to_string(image) + "\n"
-                
-        return text
+            image_paths = convert_from_bytes(content, dpi=PDF_RENDER_DPI, output_folder=path, fmt='ppm',
+                                             thread_count=1, paths_only=True)
+            texts = self._ocr_pages(self._ocr_image_file, image_paths)
+            return "".join(text + "\n" for text in texts)
+    
+    def _ocr_pdf_pdfium(self, content: bytes) -> str:
+        """Render PDF pages to numpy buffers in-process and OCR them."""
+        # pdfium isn't thread-safe, so pages are rendered here and only OCR fans out
+        pdf = pdfium.PdfDocument(content)
+        try:
+            pages = [_render_pdf_page(pdf, index) for index in range(len(pdf))]
+        finally:
+            pdf.close()
+        
+        texts = self._ocr_pages(self._ocr_array, pages)
+        return "".join(text + "\n" for text in texts)
+    
+    def _ocr_pages(self, ocr_page: Callable[[Any], str], pages: List[Any]) -> List[str]:
+        """OCR pages concurrently on the page pool; results stay in page order"""
+        if len(pages) <= 1:
+            return [ocr_page(page) for page in pages]
+        return list(self._get_ocr_executor().map(ocr_page, pages))
+    
+    def _ocr_image_file(self, image_path: str) -> str:
+        with Image.open(image_path) as image:
+            return self._ocr_image(image)
     
     def _extract_text_from_image(self, content: bytes) -> str:
-        """Extract text from an image using pytesseract OCR."""
+        """Extract text from an image using Tesseract OCR."""
+        pixels = self._preprocess_for_ocr(content)
+        if pixels is not None:
+            return self._ocr_array(pixels)
+        
         with io.BytesIO(content) as image_file:
             image = Image.open(image_file)
-            text = pytesseract.image_to_string(image)
+            text = self._ocr_image(image)
             
         return text
+    
+    def _preprocess_for_ocr(self, content: bytes):
+        """Decode an image once into a grayscale, upscaled, binarized array; None without OpenCV."""
+        if not has_opencv:
+            return None
+        gray = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            return None
+        
+        # Image.open only reads the header; bilevel images are already binarized
+        with Image.open(io.BytesIO(content)) as image:
+            bilevel = image.mode == "1"
+        
+        height, width = gray.shape
+        long_edge = max(height, width)
+        if long_edge > MAX_OCR_IMAGE_EDGE:
+            scale = MAX_OCR_IMAGE_EDGE / long_edge
+            interpolation = cv2.INTER_NEAREST if bilevel else cv2.INTER_AREA
+        elif height < MIN_OCR_IMAGE_HEIGHT:
+            scale = min(MIN_OCR_IMAGE_HEIGHT / height, MAX_OCR_IMAGE_EDGE / long_edge)
+            interpolation = cv2.INTER_NEAREST if bilevel else cv2.INTER_CUBIC
+        else:
+            scale = 1
+        if scale != 1:
+            gray = cv2.resize(gray, (round(width * scale), round(height * scale)), interpolation=interpolation)
+        if bilevel:
+            return gray
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+    
+    def _ocr_array(self, pixels) -> str:
+        """Run Tesseract on a single-channel uint8 array without a PIL round-trip."""
+        tess_api = self._get_tess_api()
+        if tess_api is None:
+            return pytesseract.image_to_string(pixels)
+        height, width = pixels.shape[:2]
+        tess_api.SetImageBytes(pixels.tobytes(), width, height, 1, width)
+        return tess_api.GetUTF8Text()
+    
+    def _ocr_image(self, image) -> str:
+        """Run Tesseract on a PIL image, in-process when tesserocr is installed."""
+        tess_api = self._get_tess_api()
+        if tess_api is None:
+            return pytesseract.image_to_string(image)
+        tess_api.SetImage(image)
+        return tess_api.GetUTF8Text()
         
     def _enhance_results(self, receipt_data: ReceiptData) -> ReceiptData:
         """Apply agentic enhancements to the parsed receipt data"""
@@ -281,28 +667,37 @@ class ReceiptProcessor:
         
         return receipt_data
     
+    def _compile_category_patterns(self) -> None:
+        """Pre-lower and encode category patterns for byte substring search"""
+        # bytes containment uses CPython's vectorized fastsearch and skips re's per-char case folding
+        self._category_patterns_b = [
+            (category, [pattern.lower().encode() for pattern in patterns if pattern])
+            for category, patterns in self.category_patterns.items()
+        ]
+        # The prompt's view of the patterns changes only alongside the lookup table
+        self._category_patterns_json = json.dumps(self.category_patterns, indent=2)
+    
     def _suggest_category(self, description: str, merchant_name: Optional[str]) -> Optional[str]:
         """Use learned patterns to suggest a category for a transaction"""
-        text_to_check = (description + " " + (merchant_name or "")).lower()
+        text_to_check = (description + " " + (merchant_name or "")).lower().encode()
         
         # Check each category's patterns
-        for category, patterns in self.category_patterns.items():
+        for category, patterns in self._category_patterns_b:
             for pattern in patterns:
-                if pattern.lower() in text_to_check:
+                if pattern in text_to_check:
                     return category
         
         return None
     
     def _validate_receipt_total(self, receipt_data: ReceiptData) -> None:
         """Validate that transaction amounts sum to approximately the receipt total"""
+        # Calculate sum of transaction amounts
+        transaction_sum = sum([t.amount for t in receipt_data.transactions])
+        
         if not receipt_data.receipt_total:
             # If no total provided, estimate it from transactions
-            total = sum(t.amount for t in receipt_data.transactions)
-            receipt_data.receipt_total = total
+            receipt_data.receipt_total = transaction_sum
             return
-            
-        # Calculate sum of transaction amounts
-        transaction_sum = sum(t.amount for t in receipt_data.transactions)
         
         # Check if total matches within a small tolerance (e.g., 1%)
         tolerance = receipt_data.receipt_total * 0.01
@@ -315,7 +710,10 @@ class ReceiptProcessor:
                                 db: Session = None, user_id: int = None) -> Dict[str, Any]:
         """Record user feedback to improve future processing"""
         feedback_id = f"{user_id}_{receipt_id}_{transaction_id}"
-        user_feedback_store[feedback_id] = feedback
+        if self.redis is not None:
+            await self.redis.hset(REDIS_FEEDBACK_KEY, feedback_id, orjson.dumps(feedback))
+        else:
+            user_feedback_store[feedback_id] = feedback
         
         # Update category patterns based on feedback
         if "correct_category" in feedback and feedback["correct_category"]:
@@ -342,13 +740,47 @@ class ReceiptProcessor:
         else:
             # Create new category
             self.category_patterns[category] = words[:3]  # Use first 3 words
+        self._compile_category_patterns()
         
-        # Save updated patterns
+        # Save updated patterns; bursts of feedback are coalesced into one write
+        self._patterns_dirty = True
         try:
-            with open('category_patterns.json', 'w') as f:
-                json.dump(self.category_patterns, f, indent=2)
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._save_category_patterns(self._category_patterns_json)
+            self._patterns_dirty = False
+            return
+        if self._patterns_flush_task is None or self._patterns_flush_task.done():
+            self._patterns_flush_task = loop.create_task(self._flush_patterns_soon())
+    
+    async def _flush_patterns_soon(self) -> None:
+        """Write the category patterns once after a quiet period"""
+        await asyncio.sleep(PATTERNS_FLUSH_DELAY_SECONDS)
+        # Feedback that lands while a write is in flight marks the patterns dirty again;
+        # keep writing until nothing is pending so that update isn't dropped
+        while self._patterns_dirty:
+            self._patterns_dirty = False
+            await run_in_threadpool(self._save_category_patterns, self._category_patterns_json)
+    
+    def _save_category_patterns(self, patterns_json: str) -> None:
+        # Write a unique temp file next to the target, fsync it and rename, so neither a
+        # crash nor another worker saving at the same time can leave a partial file
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(CATEGORY_PATTERNS_FILE)),
+                                            suffix=".tmp")
+            with os.fdopen(fd, 'w') as f:
+                f.write(patterns_json)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, CATEGORY_PATTERNS_FILE)
+            tmp_path = None
         except Exception as e:
             logger.error(f"Error saving category patterns: {str(e)}")
+        finally:
+            if tmp_path is not None:
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(tmp_path)
     
     def _update_transaction_with_feedback(self, db: Session, transaction_id: int, feedback: Dict[str, Any]) -> None:
         """Update transaction in database with user feedback"""
@@ -366,7 +798,7 @@ class ReceiptProcessor:
             if "correct_amount" in feedback:
                 transaction.amount = feedback["correct_amount"]
             if "correct_date" in feedback:
-                transaction.date = datetime.strptime(feedback["correct_date"], "%Y-%m-%d").date()
+                transaction.date = date.fromisoformat(feedback["correct_date"])
             if "correct_category" in feedback:
                 transaction.category = feedback["correct_category"]
             
@@ -379,17 +811,49 @@ class ReceiptProcessor:
             logger.error(f"Error updating transaction with feedback: {str(e)}")
             db.rollback()
     
-    @lru_cache(maxsize=100)
-    def get_merchant_insights(self, merchant_name: str, user_id: int = None) -> Dict[str, Any]:
+    async def _record_processing_result(self, key: str, data: Dict[str, Any]) -> None:
+        """Store a processing result and keep the per-merchant index in step"""
+        if self.redis is not None:
+            payload = orjson.dumps(data)
+            previous = await self.redis.hget(REDIS_RECEIPTS_KEY, key)
+            async with self.redis.pipeline(transaction=True) as pipe:
+                if previous is not None:
+                    previous_merchant = orjson.loads(previous).get("merchant_name")
+                    if previous_merchant:
+                        pipe.lrem(f"{REDIS_MERCHANT_KEY_PREFIX}{previous_merchant}", 1, previous)
+                pipe.hset(REDIS_RECEIPTS_KEY, key, payload)
+                if data.get("merchant_name"):
+                    pipe.lpush(f"{REDIS_MERCHANT_KEY_PREFIX}{data['merchant_name']}", payload)
+                await pipe.execute()
+            return
+        
+        previous = processing_history.get(key)
+        if previous is not None:
+            self._by_merchant.get(previous.get("merchant_name"), []).remove(previous)
+            self._merchant_insights_cache.pop(previous.get("merchant_name"), None)
+        
+        processing_history[key] = data
+        self._by_merchant.setdefault(data.get("merchant_name"), []).append(data)
+        self._merchant_insights_cache.pop(data.get("merchant_name"), None)
+    
+    async def get_merchant_insights(self, merchant_name: str, user_id: int = None) -> Dict[str, Any]:
         """Get insights about a merchant based on previous receipts"""
-        # This would typically query a database, but for now we'll use our in-memory store
-        receipts_for_merchant = []
+        if self.redis is not None:
+            # Other workers write to the same lists, so results aren't cached locally
+            payloads = await self.redis.lrange(f"{REDIS_MERCHANT_KEY_PREFIX}{merchant_name}", 0, -1)
+            return self._summarize_merchant(merchant_name, [orjson.loads(payload) for payload in payloads])
         
-        # Look through processing history
-        for key, data in processing_history.items():
-            if data.get("merchant_name") == merchant_name:
-                receipts_for_merchant.append(data)
+        # Cached until the next result for this merchant is recorded
+        cached_insights = self._merchant_insights_cache.get(merchant_name)
+        if cached_insights is not None:
+            return cached_insights
         
+        insights = self._summarize_merchant(merchant_name, self._by_merchant.get(merchant_name))
+        if "merchant_name" in insights:
+            self._merchant_insights_cache[merchant_name] = insights
+        return insights
+    
+    def _summarize_merchant(self, merchant_name: str, receipts_for_merchant: Optional[List[dict]]) -> Dict[str, Any]:
         if not receipts_for_merchant:
             return {"message": "No previous receipts found for this merchant"}
         
@@ -397,15 +861,14 @@ class ReceiptProcessor:
         totals = [r.get("receipt_total") for r in receipts_for_merchant if r.get("receipt_total")]
         avg_total = sum(totals) / len(totals) if totals else 0
         
-        # Find common categories
-        categories = {}
-        for receipt in receipts_for_merchant:
-            for tx in receipt.get("transactions", []):
-                category = tx.get("category")
-                if category:
-                    categories[category] = categories.get(category, 0) + 1
-        
-        top_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)[:3]
+        # Find common categories; most_common(n) uses a heap instead of sorting every category
+        categories = Counter(
+            tx["category"]
+            for receipt in receipts_for_merchant
+            for tx in receipt.get("transactions", [])
+            if tx.get("category")
+        )
+        top_categories = categories.most_common(3)
         
         return {
             "merchant_name": merchant_name,
@@ -432,7 +895,6 @@ class ReceiptProcessor:
         """Update receipt and create extracted transactions in the database"""
         try:
             from models import Receipt, ExtractedTransaction
-            from datetime import datetime
             
             # Get the receipt
             receipt = db.query(Receipt).filter(Receipt.id == receipt_id).first()
@@ -445,74 +907,79 @@ class ReceiptProcessor:
                 receipt.merchant_name = receipt_data.merchant_name
             if receipt_data.receipt_date:
                 try:
-                    receipt.receipt_date = datetime.strptime(receipt_data.receipt_date, "%Y-%m-%d").date()
+                    receipt.receipt_date = date.fromisoformat(receipt_data.receipt_date)
                 except:
                     pass
             if receipt_data.receipt_total:
                 receipt.receipt_total = receipt_data.receipt_total
                 
             receipt.processed = True
-            db.commit()
             
-            # Create extracted transactions
-            for transaction in receipt_data.transactions:
-                extracted_transaction = ExtractedTransaction(
-                    receipt_id=receipt_id,
-                    description=transaction.description,
-                    amount=transaction.amount,
-                    date=datetime.strptime(transaction.date, "%Y-%m-%d").date() if transaction.date else None,
-                    category=transaction.category
-                )
-                db.add(extracted_transaction)
-                
+            # Line items usually share the receipt date, so parse each distinct string once
+            parsed_dates = {
+                date_str: date.fromisoformat(date_str)
+                for date_str in {transaction.date for transaction in receipt_data.transactions if transaction.date}
+            }
+            
+            # Create extracted transactions in one executemany INSERT, committed with the receipt update
+            if receipt_data.transactions:
+                db.execute(insert(ExtractedTransaction), [
+                    {
+                        "receipt_id": receipt_id,
+                        "description": transaction.description,
+                        "amount": transaction.amount,
+                        "date": parsed_dates.get(transaction.date),
+                        "category": transaction.category
+                    }
+                    for transaction in receipt_data.transactions
+                ])
             db.commit()
             
         except Exception as e:
             logger.error(f"Error updating receipt with data: {str(e)}")
             db.rollback()
     
-    async def _parse_receipt_text(self, text: str) -> ReceiptData:
-        """Parse receipt text using LangChain and GPT-4 with agentic capabilities"""
-        # Build a richer prompt that incorporates learning from user patterns
-        prompt = ChatPromptTemplate.from_template("""
-        You are an intelligent agentic AI assistant specialized in extracting and analyzing information from receipts.
-        
-        Analyze this receipt text carefully and extract the following information:
-        1. Merchant name: Look for business names, logos, headers, or footers that identify the store or service provider.
-        2. Receipt date: Check for purchase dates or transaction dates in various formats and convert to YYYY-MM-DD format.
-        3. Receipt total amount: Look for 'total', 'grand total', 'amount paid', or the largest amount at the bottom.
-        4. List of transactions/items: Extract individual items, their descriptions, and their prices.
+    def _compact_ocr_text(self, text: str) -> str:
+        """Squeeze whitespace and boilerplate out of OCR text to cut prompt tokens"""
+        lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
         
-        If there are multiple items on the receipt, list each as a separate transaction.
-        Use your judgment to resolve ambiguities and apply domain knowledge to make intelligent decisions.
+        # Repeated lines without digits are headers/footers; lines with digits may be
+        # genuinely repeated line items, so those are always kept
+        seen = set()
+        compacted = []
+        for line in lines:
+            if not line:
+                continue
+            if not any(char.isdigit() for char in line):
+                if line in seen:
+                    continue
+                seen.add(line)
+            compacted.append(line)
         
-        When determining categories, think about the type of merchant and the items purchased to assign appropriate categories.
-        Learn from these patterns for categorization:
-        {category_patterns}
+        compacted_text = "\n".join(compacted)
         
-        Receipt text:
-        {receipt_text}
-        
-        Provide your answer in the following JSON format:
-        {{
-            "merchant_name": "string or null",
-            "receipt_date": "YYYY-MM-DD or null",
-            "receipt_total": number or null,
-            "transactions": [
-                {{
-                    "description": "Item description",
-                    "amount": number,
-                    "date": "YYYY-MM-DD or null",
-                    "category": "Category name"
-                }},
-                ...
-            ]
-        }}
-        """)
+        # Trim by tokens rather than lines: a few very long lines can blow the budget alone
+        edge = max(1, int(LLM_MAX_INPUT_TOKENS * LLM_TRUNCATE_EDGE_FRACTION))
+        if self._encoding is None:
+            if len(compacted_text) // 4 <= LLM_MAX_INPUT_TOKENS:
+                return compacted_text
+            return f"{compacted_text[:edge * 4]}\n...\n{compacted_text[-edge * 4:]}"
+        tokens = self._encoding.encode(compacted_text)
+        if len(tokens) <= LLM_MAX_INPUT_TOKENS or len(tokens) <= 2 * edge:
+            return compacted_text
+        return f"{self._encoding.decode(tokens[:edge])}\n...\n{self._encoding.decode(tokens[-edge:])}"
+    
+    async def _parse_receipt_text(self, text: str) -> ReceiptData:
+        """Parse receipt text using LangChain and GPT-4 with agentic capabilities"""
+        text = self._compact_ocr_text(text)
         
-        # Create the chain with memory
-        category_patterns_str = json.dumps(self.category_patterns, indent=2)
-        chain = prompt | self.llm | self.parser
+        cache_key = None
+        if self._llm_cache is not None and len(text) >= LLM_CACHE_MIN_TEXT_LENGTH:
+            cache_key = hashlib.blake2b(text.encode(), digest_size=16).hexdigest() + ":" + self.model_name
+            cached_result = self._llm_cache.get(cache_key)
+            if cached_result is not None:
+                # Enhancement is re-run so the current category patterns still apply
+                return self._enhance_results(ReceiptData.parse_obj(cached_result))
         
         # Track start time for performance monitoring
         start_time = datetime.now()
@@ -521,13 +988,16 @@ class ReceiptProcessor:
         max_retries = 3
         for attempt in range(max_retries):
             try:
-                result = await chain.ainvoke({
+                result = await self._chain.ainvoke({
                     "receipt_text": text,
-                    "category_patterns": category_patterns_str
+                    "category_patterns": self._category_patterns_json
                 })
                 
+                if cache_key is not None:
+                    self._llm_cache[cache_key] = result
+                
                 # Enhance with agentic post-processing
-                enhanced_result = self._enhance_results(result)
+                enhanced_result = self._enhance_results(ReceiptData.parse_obj(result))
                 
                 # Log successful processing time
                 processing_time = (datetime.now() - start_time).total_seconds()
@@ -1,20 +1,35 @@
+import asyncio
+import contextlib
+import hashlib
 import os
-import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status, BackgroundTasks, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 import uuid
-from datetime import datetime
+from datetime import date as date_type
 import time
 
 from database import get_db
 from models import User
 from schemas import Receipt, ExtractedTransaction, ProcessingStatus, ReceiptFeedback, TransactionFeedback, \
-    MerchantInsightRequest, ProcessedReceiptResponse, FeedbackModel
+    MerchantInsightRequest, FeedbackModel
 import crud_receipts
-from receipt_processor import ReceiptProcessor
+from receipt_processor import ReceiptProcessor, REDIS_URL, _sniff_mime
 from dependencies import get_current_user
 
+# arq hands receipt processing to separate worker processes (see worker.py)
+try:
+    from arq import create_pool
+    from arq.connections import RedisSettings
+    has_arq = True
+except ImportError:
+    has_arq = False
+
 router = APIRouter(
     prefix="/receipts",
     tags=["receipts"],
@@ -28,8 +43,54 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 # Initialize the receipt processor with default config
 receipt_processor = ReceiptProcessor()
 
-# In-memory store for tracking processing status
-processing_status_store = {}
+# With REDIS_URL set, processing is queued for the arq workers instead of running in this
+# process, so OCR and LLM calls never compete with requests for the event loop
+_job_pool = None
+
+async def get_job_pool():
+    global _job_pool
+    if _job_pool is None and REDIS_URL and has_arq:
+        _job_pool = await create_pool(RedisSettings.from_dsn(REDIS_URL))
+    return _job_pool
+
+# File types the receipt processor can read
+ALLOWED_RECEIPT_EXTENSIONS = frozenset({".pdf", ".jpg", ".jpeg", ".png"})
+
+# Upload copy buffer; large writes keep syscalls per upload low while memory stays bounded
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# One preallocated copy buffer per threadpool thread, reused for every upload it saves
+_upload_buffers = threading.local()
+
+def _copy_upload(source, file_path: str) -> str:
+    # Hash while copying: OpenSSL's SHA-256 releases the GIL on large chunks and the file
+    # never has to be read a second time
+    digest = hashlib.sha256()
+    readinto = getattr(source, "readinto", None)
+    with open(file_path, "wb") as buffer:
+        if readinto is None:
+            while data := source.read(UPLOAD_CHUNK_SIZE):
+                digest.update(data)
+                buffer.write(data)
+            return digest.hexdigest()
+        chunk = getattr(_upload_buffers, "chunk", None)
+        if chunk is None:
+            chunk = _upload_buffers.chunk = memoryview(bytearray(UPLOAD_CHUNK_SIZE))
+        while size := readinto(chunk):
+            digest.update(chunk[:size])
+            buffer.write(chunk[:size])
+    return digest.hexdigest()
+
+# Concurrent uploads queue on a few dedicated writers instead of each taking a slot in the
+# shared threadpool that sync dependencies (auth, DB sessions) also need. Finished writes
+# reach the event loop through its self-pipe, which coalesces wakeups, so a burst of
+# completions is drained in one loop iteration without a dedicated completion thread
+UPLOAD_WRITE_WORKERS = int(os.getenv("UPLOAD_WRITE_WORKERS", "4"))
+_upload_writer = ThreadPoolExecutor(max_workers=UPLOAD_WRITE_WORKERS, thread_name_prefix="upload-writer")
+
+async def save_upload(file: UploadFile, file_path: str) -> str:
+    """Write an upload to disk on the writer pool and return its SHA-256 hex digest"""
+    return await asyncio.get_running_loop().run_in_executor(_upload_writer, _copy_upload, file.file, file_path)
 
 @router.post("/", response_model=Receipt, status_code=status.HTTP_201_CREATED)
 async def upload_receipt(
@@ -48,7 +109,7 @@ async def upload_receipt(
     """
     # Check file extension
     file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in [".pdf", ".jpg", ".jpeg", ".png"]:
+    if file_ext not in ALLOWED_RECEIPT_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail="Invalid file format. Only PDF, JPG, JPEG, and PNG are supported."
@@ -59,49 +120,57 @@ async def upload_receipt(
     file_path = os.path.join(UPLOAD_DIR, unique_filename)
     
     # Save the file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    content_sha256 = await save_upload(file, file_path)
     
     try:
-        # Process the receipt with AI
-        receipt_data = await receipt_processor.process_receipt(file)
+        # Re-uploading the same file returns the receipt already extracted from it
+        existing = await run_in_threadpool(crud_receipts.find_duplicate_receipt, db, current_user.id, content_sha256)
+        if existing is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(file_path)
+            return existing
+        await file.seek(0)
         
-        # Create receipt in database
-        db_receipt = await crud_receipts.create_receipt(
-            db=db,
-            user_id=current_user.id,
-            filename=unique_filename,
-            file_path=file_path,
-            merchant_name=receipt_data.merchant_name,
-            receipt_date=datetime.strptime(receipt_data.receipt_date, "%Y-%m-%d").date() if receipt_data.receipt_date else None,
-            receipt_total=receipt_data.receipt_total
-        )
+        # Process the receipt with AI
+        receipt_data = await receipt_processor.extract_receipt_data(file)
         
-        # Create extracted transactions
-        for transaction in receipt_data.transactions:
-            await crud_receipts.create_extracted_transaction(
-                db=db,
-                receipt_id=db_receipt.id,
-                description=transaction.description,
-                amount=transaction.amount,
-                date=datetime.strptime(transaction.date, "%Y-%m-%d").date() if transaction.date else None,
-                category=transaction.category
-            )
+        # Line items usually repeat the receipt date, so parse each distinct string once
+        parsed_dates = {
+            date_str: date_type.fromisoformat(date_str)
+            for date_str in {receipt_data.receipt_date, *(t.date for t in receipt_data.transactions)}
+            if date_str
+        }
         
-        # Mark receipt as processed
-        db_receipt = crud_receipts.update_receipt(
+        # Create the processed receipt and its extracted transactions in one transaction
+        db_receipt = await run_in_threadpool(
+            crud_receipts.create_receipt_with_transactions,
             db=db,
-            receipt_id=db_receipt.id,
             user_id=current_user.id,
-            processed=True
+            receipt_fields={
+                "filename": unique_filename,
+                "file_path": file_path,
+                "merchant_name": receipt_data.merchant_name,
+                "receipt_date": parsed_dates.get(receipt_data.receipt_date),
+                "receipt_total": receipt_data.receipt_total,
+                "content_sha256": content_sha256
+            },
+            transactions=[
+                {
+                    "description": transaction.description,
+                    "amount": transaction.amount,
+                    "date": parsed_dates.get(transaction.date),
+                    "category": transaction.category
+                }
+                for transaction in receipt_data.transactions
+            ]
         )
         
         # Return the receipt with extracted transactions
         return db_receipt
     except Exception as e:
         # Clean up the file if processing fails
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(file_path)
         raise HTTPException(
             status_code=500,
             detail=f"Error processing receipt: {str(e)}"
@@ -125,7 +194,7 @@ async def upload_receipt_async(
     """
     # Check file extension
     file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in [".pdf", ".jpg", ".jpeg", ".png"]:
+    if file_ext not in ALLOWED_RECEIPT_EXTENSIONS:
         raise HTTPException(
             status_code=400,
             detail="Invalid file format. Only PDF, JPG, JPEG, and PNG are supported."
@@ -137,42 +206,80 @@ async def upload_receipt_async(
     
     # Save the file
     try:
-        # Read file content
-        file_content = await file.read()
+        # Stream to disk (the background task reads it back from there) while the receipt
+        # record with processing status is inserted; neither depends on the other. The insert
+        # commits on a sync session, so it runs on the threadpool to actually overlap the write
+        save_result, db_receipt = await asyncio.gather(
+            save_upload(file, file_path),
+            run_in_threadpool(
+                crud_receipts.create_receipt,
+                db=db,
+                user_id=current_user.id,
+                filename=unique_filename,
+                file_path=file_path,
+                status="processing",
+                progress=0.0
+            ),
+            return_exceptions=True
+        )
+        if isinstance(db_receipt, Exception):
+            raise db_receipt
+        if isinstance(save_result, Exception):
+            # Don't leave a receipt pointing at a file that was never written
+            await run_in_threadpool(crud_receipts.delete_receipt, db, receipt_id=db_receipt.id, user_id=current_user.id)
+            raise save_result
         
-        # Save to disk
-        with open(file_path, "wb") as buffer:
-            buffer.write(file_content)
-            
-        # Create receipt record with processing status
-        db_receipt = await crud_receipts.create_receipt(
-            db=db,
-            user_id=current_user.id,
-            filename=unique_filename,
-            file_path=file_path,
-            status="processing",
-            progress=0.0
+        # Skip OCR and the LLM entirely when this file was already uploaded. The digest is only
+        # known once the write finishes, so it is stored after the insert rather than with it
+        existing = await run_in_threadpool(
+            crud_receipts.find_duplicate_receipt, db, current_user.id, save_result, exclude_id=db_receipt.id
         )
+        if existing is not None:
+            await run_in_threadpool(crud_receipts.delete_receipt, db, receipt_id=db_receipt.id, user_id=current_user.id)
+            return ProcessingStatus(
+                receipt_id=existing.id,
+                status=existing.status,
+                progress=existing.progress or 0.0,
+                message="Identical receipt already uploaded"
+            )
+        await run_in_threadpool(crud_receipts.set_receipt_digest, db, db_receipt.id, save_result)
         
-        # Set initial status in memory store
-        processing_status_store[db_receipt.id] = {
-            "status": "processing",
-            "start_time": time.time(),
-            "progress": 0.0,
-            "message": "Receipt uploaded, queued for processing"
-        }
+        # Dispatch on the file's own header; clients often label uploads application/octet-stream
+        await file.seek(0)
+        mime_type = _sniff_mime(await file.read(4096))
         
-        # Add processing task to background tasks
-        background_tasks.add_task(
-            receipt_processor.process_receipt_background,
-            content=file_content,
-            filename=file.filename,
-            mime_type=file.content_type,
-            db=db,
-            receipt_id=db_receipt.id,
-            user_id=current_user.id
+        # Set initial status in the shared status store
+        await receipt_processor.status_store.set(
+            db_receipt.id,
+            status="processing",
+            start_time=time.time(),
+            progress=0.0,
+            message="Receipt uploaded, queued for processing"
         )
         
+        # Queue processing on the workers, or run it after the response without a queue
+        job_pool = await get_job_pool()
+        if job_pool is not None:
+            await job_pool.enqueue_job(
+                "process_receipt",
+                file_path,
+                file.filename,
+                mime_type,
+                db_receipt.id,
+                current_user.id,
+                _job_id=f"receipt:{db_receipt.id}"
+            )
+        else:
+            background_tasks.add_task(
+                receipt_processor.process_receipt_background,
+                file_path=file_path,
+                filename=file.filename,
+                mime_type=mime_type,
+                db=db,
+                receipt_id=db_receipt.id,
+                user_id=current_user.id
+            )
+        
         # Return processing status
         return ProcessingStatus(
             receipt_id=db_receipt.id,
@@ -183,14 +290,16 @@ async def upload_receipt_async(
         
     except Exception as e:
         # Clean up any saved file on error
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(file_path)
         raise HTTPException(
             status_code=500,
             detail=f"Error starting receipt processing: {str(e)}"
         )
 
-@router.get("/status/{receipt_id}", response_model=ProcessingStatus)
+# Polled every few seconds, so the response is built by hand instead of validated and re-encoded
+@router.get("/status/{receipt_id}", response_class=ORJSONResponse, response_model=None,
+            responses={200: {"model": ProcessingStatus}})
 async def get_processing_status(
     receipt_id: int,
     current_user: User = Depends(get_current_user),
@@ -200,32 +309,37 @@ async def get_processing_status(
     Get the status of an asynchronously processing receipt.
     """
     # First check the receipt exists and belongs to current user
-    receipt = crud_receipts.get_receipt(db, receipt_id=receipt_id, user_id=current_user.id)
-    if not receipt:
+    if crud_receipts.get_receipt_owner(db, receipt_id) != current_user.id:
         raise HTTPException(
             status_code=404,
             detail="Receipt not found"
         )
     
-    # Get status from memory store or database
-    status_info = processing_status_store.get(receipt_id, None)
+    # Get status from the status store or database
+    status_info = await receipt_processor.status_store.get(receipt_id)
     
-    # If not in memory, get from database
+    # If not in the status store, read the full receipt from the database
     if not status_info:
-        return ProcessingStatus(
-            receipt_id=receipt_id,
-            status=receipt.status or "unknown",
-            progress=receipt.progress or 1.0 if receipt.processed else 0.0,
-            message=receipt.error_message or f"Processing {receipt.status}"
-        )
+        receipt = crud_receipts.get_receipt(db, receipt_id=receipt_id, user_id=current_user.id)
+        if not receipt:
+            raise HTTPException(
+                status_code=404,
+                detail="Receipt not found"
+            )
+        return ORJSONResponse({
+            "receipt_id": receipt_id,
+            "status": receipt.status or "unknown",
+            "progress": receipt.progress or 1.0 if receipt.processed else 0.0,
+            "message": receipt.error_message or f"Processing {receipt.status}"
+        })
     
     # Return current status
-    return ProcessingStatus(
-        receipt_id=receipt_id,
-        status=status_info.get("status", "unknown"),
-        progress=status_info.get("progress", 0.0),
-        message=status_info.get("message", "Status unknown")
-    )
+    return ORJSONResponse({
+        "receipt_id": receipt_id,
+        "status": status_info.get("status", "unknown"),
+        "progress": status_info.get("progress", 0.0),
+        "message": status_info.get("message", "Status unknown")
+    })
 
 @router.post("/feedback/{receipt_id}", response_model=Dict[str, Any])
 async def submit_receipt_feedback(
@@ -251,7 +365,7 @@ async def submit_receipt_feedback(
             db=db,
             receipt_id=receipt_id,
             user_id=current_user.id,
-            feedback=feedback.dict()
+            feedback=feedback.model_dump()
         )
         
         return {"status": "success", "message": "Feedback recorded"}
@@ -292,7 +406,7 @@ async def submit_transaction_feedback(
         result = await receipt_processor.record_user_feedback(
             receipt_id=transaction.receipt_id,
             transaction_id=transaction_id,
-            feedback=feedback.feedback.dict(),
+            feedback=feedback.feedback.model_dump(),
             db=db,
             user_id=current_user.id
         )
@@ -313,7 +427,7 @@ async def get_merchant_insights(
     Get insights about a specific merchant based on transaction history.
     """
     try:
-        insights = receipt_processor.get_merchant_insights(
+        insights = await receipt_processor.get_merchant_insights(
             merchant_name=request.merchant_name,
             user_id=current_user.id
         )
@@ -325,15 +439,28 @@ async def get_merchant_insights(
             detail=f"Error generating merchant insights: {str(e)}"
         )
 
-@router.get("/", response_model=List[Receipt])
+# Validates and encodes a whole receipt page in one pass
+_RECEIPTS_ADAPTER = TypeAdapter(List[Receipt])
+
+@router.get("/", response_model=None, responses={200: {"model": List[Receipt]}})
 async def get_receipts(
-    skip: int = 0, 
+    cursor_id: Optional[int] = None,
     limit: int = 100,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all receipts for the current user."""
-    return crud_receipts.get_receipts(db=db, user_id=current_user.id, skip=skip, limit=limit)
+    """Get receipts for the current user, newest first.
+
+    Pass the X-Next-Cursor header from the previous page as cursor_id to fetch the next one.
+    """
+    receipts = crud_receipts.get_receipts(db=db, user_id=current_user.id, cursor_id=cursor_id, limit=limit)
+    response = Response(
+        content=_RECEIPTS_ADAPTER.dump_json(_RECEIPTS_ADAPTER.validate_python(receipts, from_attributes=True)),
+        media_type="application/json"
+    )
+    if receipts and len(receipts) == limit:
+        response.headers["X-Next-Cursor"] = str(receipts[-1].id)
+    return response
 
 @router.get("/{receipt_id}", response_model=Receipt)
 async def get_receipt(
@@ -362,7 +489,7 @@ async def update_receipt(
     if merchant_name is not None:
         update_data["merchant_name"] = merchant_name
     if receipt_date is not None:
-        update_data["receipt_date"] = datetime.strptime(receipt_date, "%Y-%m-%d").date()
+        update_data["receipt_date"] = date_type.fromisoformat(receipt_date)
     if receipt_total is not None:
         update_data["receipt_total"] = receipt_total
     if verified is not None:
@@ -389,6 +516,7 @@ async def delete_receipt(
     success = crud_receipts.delete_receipt(db=db, receipt_id=receipt_id, user_id=current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Receipt not found")
+    await receipt_processor.status_store.delete(receipt_id)
     return {"detail": "Receipt deleted successfully"}
 
 @router.put("/transactions/{transaction_id}", response_model=ExtractedTransaction)
@@ -409,7 +537,7 @@ async def update_transaction(
     if amount is not None:
         update_data["amount"] = amount
     if date is not None:
-        update_data["date"] = datetime.strptime(date, "%Y-%m-%d").date()
+        update_data["date"] = date_type.fromisoformat(date)
     if category is not None:
         update_data["category"] = category
     if verified is not None:
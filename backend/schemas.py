@@ -1,6 +1,6 @@
 from typing import List, Optional
 from datetime import date
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # Income schemas
 class IncomeBase(BaseModel):
@@ -19,8 +19,7 @@ class Income(IncomeBase):
     id: int
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Expense schemas
 class ExpenseBase(BaseModel):
@@ -43,8 +42,7 @@ class Expense(ExpenseBase):
     id: int
     user_id: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Receipt schemas
 class FeedbackModel(BaseModel):
@@ -60,9 +58,6 @@ class ExtractedTransactionBase(BaseModel):
     date: Optional[date] = None
     category: Optional[str] = None
 
-class ExtractedTransactionCreate(ExtractedTransactionBase):
-    receipt_id: int
-
 class ExtractedTransaction(ExtractedTransactionBase):
     id: int
     verified: bool
@@ -74,18 +69,13 @@ class ExtractedTransaction(ExtractedTransactionBase):
     original_text: Optional[str] = None
     correction_history: Optional[dict] = None
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 class ReceiptBase(BaseModel):
     merchant_name: Optional[str] = None
     receipt_date: Optional[date] = None
     receipt_total: Optional[float] = None
 
-class ReceiptCreate(ReceiptBase):
-    filename: str
-    file_path: str
-
 class Receipt(ReceiptBase):
     id: int
     filename: str
@@ -101,8 +91,7 @@ class Receipt(ReceiptBase):
     feedback: Optional[dict] = None
     extracted_transactions: List[ExtractedTransaction] = []
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
 
 # Additional schemas for agentic workflow
 class ProcessingStatus(BaseModel):
@@ -126,28 +115,6 @@ class MerchantInsightRequest(BaseModel):
     merchant_name: str
     user_id: Optional[int] = None
 
-class ProcessedReceiptResponse(BaseModel):
-    status: str
-    receipt_id: int
-    data: Optional[dict] = None
-    message: Optional[str] = None
-
-# User schemas
-class UserBase(BaseModel):
-    email: str
-
-class UserCreate(UserBase):
-    password: str
-
-class User(UserBase):
-    id: int
-    is_active: bool
-    incomes: List[Income] = []
-    expenses: List[Expense] = []
-    
-    class Config:
-        orm_mode = True
-
 # Auth schemas
 class TokenData(BaseModel):
     token: str 
\ No newline at end of file
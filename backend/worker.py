@@ -0,0 +1,50 @@
+"""
+arq worker that runs receipt OCR and LLM extraction outside the web processes.
+
+Start it next to the API with:
+
+    arq worker.WorkerSettings
+"""
+import os
+import logging
+
+from arq.connections import RedisSettings
+
+from database import SessionLocal
+from receipt_processor import ReceiptProcessor, REDIS_URL
+
+logger = logging.getLogger(__name__)
+
+# Receipts processed concurrently by one worker process; OCR pages already fan out to threads
+RECEIPT_WORKER_MAX_JOBS = int(os.getenv("RECEIPT_WORKER_MAX_JOBS", "4"))
+# Generous ceiling for a multi-page scan plus a slow LLM round trip
+RECEIPT_JOB_TIMEOUT_SECONDS = int(os.getenv("RECEIPT_JOB_TIMEOUT_SECONDS", "600"))
+
+async def process_receipt(ctx, file_path: str, filename: str, mime_type: str, receipt_id: int, user_id: int):
+    """Process one uploaded receipt with its own database session"""
+    db = SessionLocal()
+    try:
+        await ctx["receipt_processor"].process_receipt_background(
+            file_path=file_path,
+            filename=filename,
+            mime_type=mime_type,
+            user_id=user_id,
+            db=db,
+            receipt_id=receipt_id
+        )
+    except Exception:
+        logger.exception("Receipt job for receipt %s failed", receipt_id)
+        raise
+    finally:
+        db.close()
+
+async def startup(ctx):
+    # One processor per worker process, so the OCR engines and caches are reused across jobs
+    ctx["receipt_processor"] = ReceiptProcessor()
+
+class WorkerSettings:
+    functions = [process_receipt]
+    on_startup = startup
+    redis_settings = RedisSettings.from_dsn(REDIS_URL or "redis://localhost:6379/0")
+    max_jobs = RECEIPT_WORKER_MAX_JOBS
+    job_timeout = RECEIPT_JOB_TIMEOUT_SECONDS